@@ -1,21 +1,25 @@
 # -*- coding: utf-8 -*-
 # 새출발용 안정화본 — 블로그·유튜브 통합 생성기
-# 동기 실행 · JSON 강제 · 자동 재시도/모델 스위치 · 폴백 보장 · 세션 안전
+# 백그라운드 작업 큐 · 병렬 실행 · JSON 강제 · 자동 재시도/모델 스위치 · 폴백 보장 · 세션 안전
 
-import os, re, json, time, uuid, html
-from datetime import datetime, timezone, timedelta
+import os, html, json, time, uuid, hashlib
+from datetime import datetime
 import streamlit as st
 from streamlit.components.v1 import html as comp_html
 from openai import OpenAI
 
+import core
+import jobs
+import telemetry
+from core import (KST, CACHE_PATH, cache_stats, cache_clear, detect_demo, img_en, classify_mode,
+                  gen_youtube, gen_blog, join_tags, build_youtube_txt, build_blog_md)
+
 # ============== 기본 ==============
-KST = timezone(timedelta(hours=9))
 APP_TITLE = "⚡ 블로그·유튜브 통합 생성기 (안정화본)"
-CTA = "강쌤철물 집수리 관악점에 지금 바로 문의주세요. 상담문의: 010-2276-8163"
 
 st.set_page_config(page_title=APP_TITLE, page_icon="⚡", layout="wide")
 st.title(APP_TITLE)
-st.caption(f"KST {datetime.now(KST).strftime('%Y-%m-%d %H:%M')} · 한국어 고정 · EN 이미지 프롬프트 · 동기 실행")
+st.caption(f"KST {datetime.now(KST).strftime('%Y-%m-%d %H:%M')} · 한국어 고정 · EN 이미지 프롬프트 · 병렬 실행")
 
 # 세션 기본값(항상 setdefault)
 st.session_state.setdefault("model_text", "gpt-4o-mini")
@@ -31,136 +35,100 @@ except Exception:
 def _load_api_key() -> str:
     return os.getenv("OPENAI_API_KEY", st.secrets.get("OPENAI_API_KEY", ""))
 
+HEALTH_TTL_S = int(os.getenv("OPENAI_HEALTH_TTL", "300"))
+
+# 클라이언트는 core에서 프로세스당 1개(커넥션 풀 공유). 여기서는 키 확인 + 주입만
 def _client() -> OpenAI:
     ak = _load_api_key()
     if not ak:
         st.error("❌ OPENAI_API_KEY 미설정. Streamlit Secrets 또는 환경변수에 등록하세요.")
         st.stop()
-    return OpenAI(api_key=ak, timeout=50)
+    core.set_api_key(ak)
+    return core.client()
 
-# 부팅 헬스체크(명확)
-try:
-    _ = _client().models.list()
-    st.success("✅ OpenAI API 연결 OK")
-except Exception as e:
-    st.error("⚠️ OpenAI API 연결 실패")
-    st.exception(e)
-    st.stop()
-
-# ============== 유틸 ==============
-def _copy_iframe_html(title: str, esc_text: str, height: int) -> str:
-    return f"""
-<!DOCTYPE html><html><head><meta charset="utf-8" />
-<style>
-body{{margin:0;font-family:system-ui,-apple-system,'Noto Sans KR',Arial}}
-.wrap{{border:1px solid #e5e7eb;border-radius:10px;padding:10px}}
-.ttl{{font-weight:600;margin-bottom:6px}}
-textarea{{width:100%;height:{height}px;border:1px solid #d1d5db;border-radius:8px;padding:8px;white-space:pre-wrap;box-sizing:border-box;font-family:ui-monospace,Menlo,Consolas}}
-.row{{display:flex;gap:8px;align-items:center;margin-top:8px}}
-.btn{{padding:6px 10px;border-radius:8px;border:1px solid #d1d5db;cursor:pointer;background:#fff}}
-small{{color:#6b7280}}
-</style></head><body>
-<div class="wrap">
-  <div class="ttl">{html.escape(title or '')}</div>
-  <textarea id="ta" readonly>{esc_text}</textarea>
-  <div class="row">
-    <button class="btn" id="copyBtn">📋 복사</button>
-    <small>안 되면 텍스트 클릭 → Ctrl+A → Ctrl+C</small>
-  </div>
-</div>
-<script>
-(()=>{{const b=document.getElementById("copyBtn");const t=document.getElementById("ta");
-if(!b||!t)return;b.onclick=async()=>{{try{{await navigator.clipboard.writeText(t.value);
-b.textContent="✅ 복사됨";setTimeout(()=>b.textContent="📋 복사",1200)}}catch(e){{try{{t.focus();t.select();document.execCommand("copy");
-b.textContent="✅ 복사됨";setTimeout(()=>b.textContent="📋 복사",1200)}}catch(err){{alert("복사가 차단되었습니다. 직접 선택해 복사해주세요.")}}}}}})();
-</script></body></html>
-"""
+# 헬스체크: 부팅 시 매 rerun마다 돌리지 않고, 필요할 때(생성 직전/버튼) TTL 캐시로 1회
+@st.cache_data(ttl=HEALTH_TTL_S, show_spinner=False)
+def _health_check(api_key: str) -> str:
+    _client().models.list()  # 실패는 예외 → 캐시되지 않음
+    return datetime.now(KST).strftime("%H:%M")
 
-def copy_block(title: str, text: str, height: int = 160):
-    esc_t = (text or "").replace("&","&amp;").replace("<","&lt;").replace(">","&gt;")
-    html_str = _copy_iframe_html(title or "", esc_t, height)
+def health_ok() -> bool:
+    ak = _load_api_key()
+    if not ak: _client()  # 키 미설정 안내 후 중단
     try:
-        if HTML_SUPPORTS_KEY: comp_html(html_str, height=height+110, scrolling=False, key=f"copy_{uuid.uuid4().hex}")
-        else:                  comp_html(html_str, height=height+110, scrolling=False)
-    except Exception:
-        st.text_area(title or "", text or "", height=height)
-
-def find_json(s: str) -> str:
-    if not isinstance(s, str): return ""
-    m = re.search(r"\{.*\}", s, re.S)
-    return m.group(0) if m else ""
-
-def parse_json(s: str, fallback: dict) -> dict:
+        st.session_state["health"] = ("ok", _health_check(ak))
+        return True
+    except Exception as e:
+        st.session_state["health"] = ("fail", f"{type(e).__name__}: {e}")
+        return False
+
+# ============== 패키지 렌더러(iframe 1개) ==============
+# 패키지 하나(유튜브/블로그)를 문서 1개로 그림: 공용 CSS/JS 1벌 + 복사 블록들. 복사 버튼은 이벤트 위임 1개.
+# 접힌 묶음(<details>)은 <template>에 넣어 두고 처음 펼칠 때 DOM을 만든다(lazy).
+# 임의 키(uuid)를 쓰지 않으므로 내용이 같으면 문서도 같아 재실행 때 iframe을 새로 만들지 않음(키 지원 시 내용 해시).
+_PKG_CSS = """
+body{margin:0;padding:2px;font-family:system-ui,-apple-system,'Noto Sans KR',Arial}
+.blk{border:1px solid #e5e7eb;border-radius:10px;padding:10px;margin-bottom:10px}
+.ttl{font-weight:600;margin-bottom:6px}
+textarea{width:100%;border:1px solid #d1d5db;border-radius:8px;padding:8px;white-space:pre-wrap;box-sizing:border-box;font-family:ui-monospace,Menlo,Consolas}
+.row{display:flex;gap:8px;align-items:center;margin-top:8px}
+.btn{padding:6px 10px;border-radius:8px;border:1px solid #d1d5db;cursor:pointer;background:#fff}
+small{color:#6b7280}
+details{border:1px solid #e5e7eb;border-radius:10px;padding:8px 10px;margin-bottom:10px}
+summary{cursor:pointer;font-weight:600}
+details .blk{margin:10px 0 0}
+"""
+_PKG_JS = """
+document.addEventListener("click",async e=>{
+  const b=e.target.closest("[data-copy]"); if(!b) return;
+  const t=b.closest(".blk").querySelector("textarea");
+  try{await navigator.clipboard.writeText(t.value)}
+  catch(_){try{t.focus();t.select();document.execCommand("copy")}
+           catch(err){alert("복사가 차단되었습니다. 직접 선택해 복사해주세요.");return}}
+  b.textContent="✅ 복사됨"; setTimeout(()=>b.textContent="📋 복사",1200);
+});
+document.querySelectorAll("details").forEach(d=>d.addEventListener("toggle",()=>{
+  const t=d.querySelector("template"); if(d.open&&t){d.appendChild(t.content); t.remove();}
+}));
+"""
+_TIP = "<small>안 되면 텍스트 클릭 → Ctrl+A → Ctrl+C</small>"
+
+def _block_html(title: str, text: str, height: int) -> str:
+    return (f'<div class="blk"><div class="ttl">{html.escape(title or "")}</div>'
+            f'<textarea readonly style="height:{height}px">{html.escape(text or "", quote=False)}</textarea>'
+            f'<div class="row"><button class="btn" data-copy>📋 복사</button>{_TIP}</div></div>')
+
+def package_html(blocks: list):
+    # blocks: (제목, 텍스트, 높이) 또는 ("접힘", 묶음 제목, [(제목, 텍스트, 높이), …]) → (문서, 펼치기 전 높이)
+    parts, h = [], 8
+    for b in blocks:
+        if b[0] == "접힘":
+            inner = "".join(_block_html(*x) for x in b[2])
+            parts.append(f"<details><summary>{html.escape(b[1])}</summary><template>{inner}</template></details>")
+            h += 50
+        else:
+            parts.append(_block_html(*b)); h += b[2] + 84
+    doc = (f'<!DOCTYPE html><html><head><meta charset="utf-8" /><style>{_PKG_CSS}</style></head>'
+           f'<body>{"".join(parts)}<script>{_PKG_JS}</script></body></html>')
+    return doc, h
+
+def render_blocks(blocks: list, max_height: int = 1600):
+    doc, h = package_html(blocks)
     try:
-        return json.loads(find_json(s) or "") or fallback
+        if HTML_SUPPORTS_KEY: comp_html(doc, height=min(h, max_height), scrolling=True,
+                                        key="pkg_"+hashlib.sha256(doc.encode("utf-8")).hexdigest()[:16])
+        else:                  comp_html(doc, height=min(h, max_height), scrolling=True)
     except Exception:
-        return fallback
-
-# ============== LLM 호출( JSON 강제 + 재시도 + 모델 스위치 ) ==============
-def call_json(system: str, user: str, model: str, temperature: float) -> str:
-    cli = _client()
-
-    def _once(md: str) -> str:
-        r = cli.chat.completions.create(
-            model=md,
-            temperature=temperature,
-            max_tokens=1800,                 # 과도 토큰 방지
-            timeout=50,
-            response_format={"type": "json_object"},  # JSON 강제
-            messages=[{"role":"system","content":system},
-                      {"role":"user","content":user}],
-        )
-        return r.choices[0].message.content.strip()
-
-    waits=[0.7,1.2,2.0]
-    # 1차: 선택 모델
-    for i,w in enumerate(waits):
-        try: return _once(model)
-        except Exception:
-            if i < len(waits)-1: time.sleep(w)
-    # 2차: gpt-4o 스위치
-    for i,w in enumerate(waits):
-        try: return _once("gpt-4o")
-        except Exception:
-            if i < len(waits)-1: time.sleep(w)
-    return ""  # 최종 실패시 빈 문자열
-
-# ============== 타깃/이미지 ==============
-def detect_demo(topic: str):
-    t=(topic or "").lower()
-    age="성인"
-    for pat,label in [(r"(유아|영유아|신생아)","유아"),(r"(아동|초등|키즈)","아동"),
-                      (r"(청소년|10대)","청소년"),(r"20대","20대"),(r"30대","30대"),
-                      (r"40대","40대"),(r"50대|장년|중년","50대"),(r"60대|시니어","60대"),
-                      (r"70대|고령","70대")]:
-        if re.search(pat,t): age=label; break
-    if re.search(r"(남성|남자|아빠|형|삼촌|남편)", t): gender="남성"
-    elif re.search(r"(여성|여자|엄마|언니|이모|아내)", t): gender="여성"
-    else: gender="혼합"
-    return age, gender
-
-def img_en(base_en, age, gender, place, mood, shot, style):
-    age_map={"유아":"toddlers","아동":"children","청소년":"teenagers","20대":"people in their 20s",
-             "30대":"people in their 30s","40대":"people in their 40s","50대":"people in their 50s",
-             "60대":"people in their 60s","70대":"people in their 70s","성인":"adults"}
-    gender_map={"남성":"Korean man","여성":"Korean woman","혼합":"Korean men and women"}
-    place_map={"한국 가정 거실":"modern Korean home living room interior",
-               "한국 아파트 단지":"Korean apartment complex outdoor area",
-               "한국 동네 공원":"local Korean neighborhood park",
-               "한국 병원/검진센터":"Korean medical clinic interior",
-               "한국형 주방/식탁":"modern Korean kitchen and dining table"}
-    shot_map={"클로즈업":"close-up","상반신":"medium shot","전신":"full body shot","탑뷰/테이블샷":"top view table shot"}
-    mood_map={"따뜻한":"warm","밝은":"bright","차분한":"calm","활기찬":"energetic"}
-    style_map={"사진 실사":"realistic photography, high resolution","시네마틱":"cinematic photo style",
-               "잡지 화보":"editorial magazine style","자연광":"natural lighting"}
-    return (f"{gender_map.get(gender,'Korean men and women')} {age_map.get(age,'adults')} at a "
-            f"{place_map.get(place,'modern Korean interior')}, {shot_map.get(shot,'medium shot')}, "
-            f"{mood_map.get(mood,'warm')} mood, {style_map.get(style,'realistic photography, high resolution')}. "
-            f"Context: {base_en}. natural lighting, high contrast, no text overlay, no captions, no watermarks, no logos.")
+        for b in blocks:
+            for t, text, height in (b[2] if b[0] == "접힘" else [b]): st.text_area(t, text or "", height=height)
 
 # ============== 사이드바 ==============
 with st.sidebar:
     st.header("⚙️ 생성 설정")
+    hs = st.session_state.get("health")
+    if st.button("🔌 API 연결 확인"): health_ok(); hs = st.session_state.get("health")
+    if hs and hs[0]=="ok": st.caption(f"✅ OpenAI API 연결 OK ({hs[1]} 확인)")
+    elif hs:               st.caption(f"⚠️ OpenAI API 연결 실패 — {hs[1]}")
     st.selectbox("모델", ["gpt-4o-mini","gpt-4o"], index=0, key="model_text")
     temperature = st.slider("창의성", 0.0, 1.2, 0.6, 0.1)
 
@@ -184,8 +152,22 @@ with st.sidebar:
     tag_join   = st.radio("태그 결합 방식", ["띄어쓰기 한 줄","줄바꿈 여러 줄"], 0)
 
     st.markdown("---")
-    if st.checkbox("강제 재생성(캐시 무시)", value=False):
-        st.cache_data.clear()
+    stream_on = st.checkbox("스트리밍 미리보기", value=True,
+                            help="생성되는 대로 제목·설명·챕터·본문 섹션을 먼저 보여줍니다.")
+    fanout = st.checkbox("분할 생성(아웃라인→병렬)", value=False,
+                         help="아웃라인을 먼저 받고 챕터·블로그 섹션을 동시에 나눠 생성합니다. 긴 글이 잘리지 않고 더 빠릅니다(호출 수는 늘어남).")
+    force_refresh = st.checkbox("강제 재생성(캐시 무시)", value=False,
+                                help="체크 시 저장된 응답을 쓰지 않고 새로 생성해 캐시를 갱신합니다.")
+    cs = cache_stats()
+    st.caption(f"💾 응답 캐시: {cs['entries']}건 · {cs['bytes']/1024/1024:.1f}MB" if CACHE_PATH else "💾 응답 캐시: 꺼짐")
+    if CACHE_PATH and st.button("캐시 비우기"):
+        cache_clear(); st.rerun()
+    js = jobs.get_queue().stats()
+    st.caption(f"🧵 작업 큐: 실행 {js['running']} · 대기 {js['queued']} (워커 {jobs.JOB_WORKERS} · 탭당 {jobs.JOB_PER_USER}건)")
+    st.caption("한도는 브라우저 탭(URL의 ?u=) 단위 — 새 탭은 별도 사용자로 셉니다. 같은 URL을 열면 작업을 이어받습니다.")
+
+    st.markdown("---")
+    show_admin = st.checkbox("📊 운영 지표(관리자)", value=False) if telemetry.TELEMETRY_PATH else False
 
 # ============== 입력 ==============
 st.subheader("🎯 주제 및 내용")
@@ -195,12 +177,10 @@ with c2: tone  = st.selectbox("톤/스타일", ["시니어 친화형","전문가
 with c3: mode_sel = st.selectbox("콘텐츠 유형", ["자동 분류","정보형(블로그 지수)","시공후기형(영업)"], 1)
 with c4: target = st.selectbox("생성 대상", ["유튜브 + 블로그","유튜브만","블로그만"], 0)
 
-def _classify(txt): 
-    return "sales" if any(k in txt for k in ["시공","교체","설치","수리","누수","보수","후기","현장","관악","강쌤철물"]) else "info"
 def _mode():
     if mode_sel=="정보형(블로그 지수)": return "info"
     if mode_sel=="시공후기형(영업)":   return "sales"
-    return _classify(topic)
+    return classify_mode(topic)
 mode = _mode()
 
 auto_age, auto_gender = detect_demo(topic)
@@ -211,179 +191,258 @@ st.caption("옵션 확인 후 아래 버튼으로 실행하세요.")
 go = st.button("▶ 한 번에 생성", type="primary")
 MODEL = st.session_state.get("model_text","gpt-4o-mini")
 
-# ============== 스키마/폴백 ==============
-def schema_for_llm(min_chars:int) -> str:
-    return f'''{{
-  "demographics": {{"age_group":"{final_age}","gender":"{final_gender}"}},
-  "youtube": {{
-    "titles": ["..."],
-    "description": "...",
-    "chapters": [{{"title":"...","script":"..."}}],
-    "images": {{"thumbnail": {{"en":"(EN no text)"}}, "chapters": [{{"index":1,"en":"(EN no text)"}}]}},
-    "hashtags": ["#.."]
-  }},
-  "blog": {{
-    "titles": ["..."],
-    "body": ">= {min_chars}자, 구조: 서론→핵심5→체크리스트(6~8)→자가진단(5)→FAQ(3)→마무리. 본문 내 [이미지:대표/본문1/본문2] 포함",
-    "images": [{{"label":"대표","en":"(EN no text)"}}],
-    "tags": ["#.."]
-  }}
-}}'''
-
-def fb_youtube(topic:str, n:int):
-    ch=[{"title":f"{topic} 핵심 포인트 {i+1}",
-         "script":f"{topic} 관련 핵심 포인트 {i+1}을(를) 현장 기준으로 간단히 설명합니다."} for i in range(n)]
-    return {"titles":[f"{topic} 가이드 {i+1}" for i in range(10)],
-            "description":f"{topic} 요약 가이드입니다.",
-            "chapters":ch,
-            "images":{"thumbnail":{"en":"Korean home thumbnail, no text overlay"},
-                      "chapters":[{"index":i+1,"en":"support visual, no text overlay"} for i in range(n)]},
-            "hashtags":["#집수리","#현장팁","#강쌤철물"]*5}
-
-def fb_blog(topic:str, img_n:int, mode:str):
-    body=(f"## {topic}\n\n네트워크 지연 시 제공되는 안전본입니다.\n\n"
-          "### 핵심 5가지\n1) 현장 진단\n2) 원인 추정\n3) 준비물 체크\n4) 순서대로 작업\n5) 마무리 점검\n\n"
-          "### 체크리스트(6~8)\n- 누수/결선/고정\n- 소음/진동\n- 경고등/오류코드\n- 마감\n- 재방문 필요성\n- 사진 기록\n\n"
-          "### 자가진단(5)\n- 증상 지속 여부\n- 특정 조건만 발생?\n- 최근 교체/수리 이력\n- 임시조치 효과\n- A/S 대상 여부\n\n"
-          "### FAQ(3)\n- 시간: 1~3시간\n- 비용: 난이도/부품 의존\n- 준비: 공간확보·전원/밸브 차단\n\n"
-          "[이미지:대표]\n[이미지:본문1]\n[이미지:본문2]\n")
-    if mode=="sales": body += f"\n{CTA}"
-    imgs=[{"label":"대표","en":"Korean home context, no text overlay"}]+[
-        {"label":f"본문{i}","en":f"support visual for section {i} of '{topic}' (no text overlay)"} for i in range(1,img_n)
-    ]
-    return {"titles":[f"{topic} 블로그 {i+1}" for i in range(10)],
-            "body":body,"images":imgs[:img_n],
-            "tags":["#집수리","#시공후기","#관악구","#강쌤철물"]}
-
-# ============== 생성 ==============
-def gen_youtube(topic,tone,n,mode,model):
-    sys=(
-      "[voice] 20년 차 현장 전문가 '강쌤'. 차분·존대, 가벼운 유머. 2~3문장마다 호흡.\n"
-      "사례/비교/주의/대안 포함. 마무리 2줄 요약+체크 3~5.\n"
-      "한국 맥락. 반드시 JSON만 반환."
-    )
-    user=(f"[topic]{topic}\n[tone]{tone}\n[mode]{'info' if mode=='info' else 'sales'}\n[N]{n}\n"
-          f"[demo] age={final_age}, gender={final_gender}\n[schema]\n{schema_for_llm(0)}")
-    raw=call_json(sys,user,model,min(temperature,0.6))
-    data=parse_json(raw,{})
-    if not data.get("youtube"):  # 모델 스위치 재시도
-        data=parse_json(call_json(sys,user,"gpt-4o",0.6),{})
-    yt=data.get("youtube") or {}
-    if not yt.get("titles"): yt["titles"]=[f"{topic} 가이드 {i+1}" for i in range(10)]
-    if (not yt.get("description")) or (not yt.get("chapters")): yt=fb_youtube(topic,n)
-    # CTA
-    if mode=="sales":
-        desc=(yt.get("description","") or "").rstrip()
-        if CTA not in desc: yt["description"]=(desc+f"\n{CTA}").strip()
-    # 이미지 기본
-    if "images" not in yt:
-        yt["images"]={"thumbnail":{"en":"Korean home thumbnail, no text overlay"},
-                      "chapters":[{"index":i+1,"en":"support visual, no text overlay"} for i in range(n)]}
-    return yt
-
-def gen_blog(topic,tone,mode,min_chars,img_n,model):
-    sys=(
-      "[voice] 20년 차 현장 전문가 '강쌤'. 차분·존대. 현장 디테일 1~2개.\n"
-      f"길이>={min_chars}자. 구조: 서론→핵심5→체크리스트(6~8)→자가진단(5)→FAQ(3)→마무리. JSON만."
-    )
-    user=(f"[topic]{topic}\n[tone]{tone}\n[mode]{'info' if mode=='info' else 'sales'}\n"
-          f"[demo] age={final_age}, gender={final_gender}\n[schema]\n{schema_for_llm(min_chars)}")
-    raw=call_json(sys,user,model,min(temperature,0.6))
-    data=parse_json(raw,{})
-    if not data.get("blog"):  # 모델 스위치 재시도
-        data=parse_json(call_json(sys,user,"gpt-4o",0.6),{})
-    blog=data.get("blog") or {}
-    if (not blog.get("body")) or (len(blog.get("body",""))<500): blog=fb_blog(topic,img_n,mode)
-    if mode=="sales" and CTA not in blog.get("body",""):
-        blog["body"]=(blog.get("body","").rstrip()+f"\n\n{CTA}")
-    # 이미지 개수 맞추기
-    imgs=(blog.get("images") or [])[:img_n]
-    while len(imgs)<img_n:
-        i=len(imgs)
-        imgs.append({"label":"대표" if i==0 else f"본문{i}",
-                     "en":f"support visual for section {i} of '{topic}' (no text overlay)"})
-    blog["images"]=imgs
-    if not blog.get("titles"): blog["titles"]=[f"{topic} 블로그 {i+1}" for i in range(10)]
-    if not blog.get("tags"): blog["tags"]=["#집수리","#시공후기","#관악구","#강쌤철물"]
-    return blog
-
-# ============== 내보내기 ==============
-def join_tags(tags:list, style:str) -> str:
-    return "\n".join(tags) if style=="줄바꿈 여러 줄" else " ".join(tags)
-
-def build_youtube_txt(yt:dict) -> str:
-    titles="\n".join(f"{i+1}. {t}" for i,t in enumerate(yt.get("titles",[])[:10]))
-    chapters="\n\n".join(f"[챕터 {i+1}] {c.get('title','')}\n{c.get('script','')}" for i,c in enumerate(yt.get("chapters",[])))
-    desc=yt.get("description","").strip()
-    tags=" ".join(yt.get("hashtags",[]))
-    return f"# YouTube Package\n\n## Titles\n{titles}\n\n## Description\n{desc}\n\n## Chapters\n{chapters}\n\n## Hashtags\n{tags}\n"
-
-def build_blog_md(blog:dict) -> str:
-    titles="\n".join(f"{i+1}. {t}" for i,t in enumerate(blog.get("titles",[])[:10]))
-    body=blog.get("body","")
-    tags=" ".join(blog.get("tags",[]))
-    return f"# Blog Package\n\n## Titles\n{titles}\n\n## Body\n{body}\n\n## Tags\n{tags}\n"
+# ============== 렌더 ==============
+def render_youtube(yt:dict, topic:str):
+    st.markdown("## 📺 유튜브 패키지")
+    chs=yt.get("chapters",[])[:target_chapter]
+    blocks=[("① 영상 제목(SEO 10)", "\n".join([f"{i+1}. {t}" for i,t in enumerate(yt.get("titles",[])[:10])]), 160),
+            ("② 영상 설명", yt.get("description",""), 160),
+            ("③ 브루 자막 — 전체 일괄(Vrew)", "\n".join([(c.get("script","") or "").replace("\n"," ") for c in chs]), 220)]
+    if include_thumb:
+        blocks.append(("[썸네일] EN",
+                       img_en(f"YouTube thumbnail for topic: {topic}. Korean home context.",
+                              final_age, final_gender, img_place, img_mood, img_shot, img_style), 110))
+    blocks.append(("⑤ 해시태그(20)", " ".join(yt.get("hashtags",[])), 90))
+    render_blocks(blocks)
+    st.download_button("⬇️ 유튜브 패키지 .txt",
+                       build_youtube_txt(yt).encode("utf-8"),
+                       file_name="youtube_package.txt", mime="text/plain")
+
+def render_blog(blog:dict, topic:str):
+    st.markdown("---"); st.markdown("## 📝 블로그 패키지")
+    blocks=[("① 블로그 제목(SEO 10)", "\n".join([f"{i+1}. {t}" for i,t in enumerate(blog.get("titles",[])[:10])]), 160),
+            ("② 본문 (이미지 앵커 포함)", blog.get("body",""), 420),
+            ("②-β 본문+해시태그 (한 번에 복사)",
+             f"{blog.get('body','').rstrip()}\n\n{join_tags(blog.get('tags',[]), tag_join)}", 460)]
+    if blog.get("images"):
+        imgs=[]
+        for p in blog.get("images",[]):
+            base = p.get("en","") or f"support visual for section '{p.get('label','')}'"
+            imgs.append((f"[{p.get('label','이미지')}] EN",
+                         img_en(base, final_age, final_gender, img_place, img_mood, img_shot, img_style), 110))
+        blocks.append(("접힘", "③ 이미지 프롬프트 (EN only, no text overlay)", imgs))
+    blocks.append(("④ 태그(20)", join_tags(blog.get("tags",[]), tag_join), 100))
+    render_blocks(blocks)
+    st.download_button("⬇️ 블로그 패키지 .md",
+                       build_blog_md(blog).encode("utf-8"),
+                       file_name="blog_package.md", mime="text/markdown")
+
+# 스트리밍 미리보기(가벼운 markdown만, iframe 없음) — 완료되면 render_*로 교체
+def _done_sections(body:str) -> str:
+    # 마지막 제목(#) 앞까지 = 다 쓴 섹션들
+    cut=body.rfind("\n#")
+    return body[:cut] if cut>0 else ""
+
+def preview_youtube(yt:dict):
+    st.markdown("#### 📺 유튜브 생성 중…")
+    if yt.get("titles"): st.markdown("\n".join(f"{i+1}. {t}" for i,t in enumerate(yt["titles"][:10])))
+    if yt.get("description"): st.caption(yt["description"])
+    for i,c in enumerate(yt.get("chapters") or []):
+        if isinstance(c,dict) and c.get("script"):
+            st.markdown(f"**[챕터 {i+1}] {c.get('title','')}**  \n{c['script']}")
+
+def preview_blog(blog:dict):
+    st.markdown("#### 📝 블로그 생성 중…")
+    if blog.get("titles"): st.markdown("\n".join(f"{i+1}. {t}" for i,t in enumerate(blog["titles"][:10])))
+    body=_done_sections(blog.get("body") or "")
+    if body: st.markdown(body)
+
+# 운영 지표: telemetry JSONL → 일별 p50/p95 지연, 재시도·모델 스위치·폴백 비율, 주제별 토큰
+def render_admin(days:int):
+    import pandas as pd
+    recs=telemetry.read(days)
+    if not recs: st.info("아직 기록이 없습니다."); return
+    df=pd.DataFrame(recs)
+    for c in ["kind","ms","cache","attempts","answered_by","model_switch","fallback","parse_fail",
+              "hedged","topic","target","prompt_tokens","completion_tokens","state","wait_ms"]:
+        if c not in df: df[c]=None
+    df["day"]=pd.to_datetime(df["ts"],unit="s",utc=True).dt.tz_convert("Asia/Seoul").dt.strftime("%m-%d")
+    for c in ["model_switch","fallback","hedged"]: df[c]=df[c].eq(True)
+    for c in ["attempts","parse_fail","prompt_tokens","completion_tokens"]: df[c]=pd.to_numeric(df[c],errors="coerce").fillna(0)
+    calls=df[df["kind"]=="call"]; live=calls[calls["cache"]!="hit"]; gens=df[df["kind"]=="gen"]
+
+    m1,m2,m3,m4,m5=st.columns(5)
+    m1.metric("생성 p50 / p95", f"{gens['ms'].quantile(.5)/1000:.1f}s / {gens['ms'].quantile(.95)/1000:.1f}s" if len(gens) else "-")
+    m2.metric("API 호출 p50 / p95", f"{live['ms'].quantile(.5)/1000:.1f}s / {live['ms'].quantile(.95)/1000:.1f}s" if len(live) else "-")
+    m3.metric("캐시 적중률", f"{(calls['cache']=='hit').mean():.0%}" if len(calls) else "-")
+    m4.metric("폴백 사용률", f"{gens['fallback'].mean():.0%}" if len(gens) else "-")
+    m5.metric("호출당 시도", f"{live['attempts'].mean():.2f}" if len(live) else "-")
+    jb=df[df["kind"]=="job"]
+    if len(jb): st.caption(f"🧵 작업 큐 대기 p50 {jb['wait_ms'].quantile(.5)/1000:.1f}s · p95 {jb['wait_ms'].quantile(.95)/1000:.1f}s"
+                           f" · 실패 {(jb['state']=='failed').mean():.0%} ({len(jb)}건)")
+    if not len(gens): return
+
+    st.markdown("##### 일별 생성 지연(초)")
+    lat=gens.groupby("day")["ms"].quantile([.5,.95]).unstack()/1000
+    lat.columns=["p50","p95"]; st.line_chart(lat)
+    st.markdown("##### 일별 비율 — 폴백 · 모델 스위치 · JSON 파싱 실패")
+    rate=gens.assign(parse_fail=gens["parse_fail"]>0).groupby("day")[["fallback","model_switch","parse_fail"]].mean()
+    st.line_chart(rate)
+    if len(live):
+        st.markdown("##### 응답 모델 · 헤지")
+        st.dataframe(live.groupby("answered_by").agg(calls=("ms","size"),p50_ms=("ms","median"),
+                     p95_ms=("ms",lambda x: x.quantile(.95)),hedged=("hedged","mean"),attempts=("attempts","mean")))
+    st.markdown("##### 주제별 토큰 사용")
+    tok=gens.groupby("topic")[["prompt_tokens","completion_tokens"]].sum()
+    tok["total"]=tok.sum(axis=1)
+    st.dataframe(tok.sort_values("total",ascending=False).head(30))
+
+# ============== 결과 보관(세션) ==============
+# 생성 결과는 입력 해시를 키로 session_state에 보관 → 다운로드 클릭·익스팬더·사이드바 조작으로 재실행돼도 유지.
+# 표시 전용 옵션(태그 결합·이미지 분위기/샷/스타일·썸네일 포함)은 해시에 넣지 않음 → LLM 호출 없이 다시 그림.
+PKG_KEEP = 8  # 세션당 보관 개수(오래된 것부터 제거)
+
+def _pkg_key(k:str) -> str:
+    spec=[topic,tone,mode,MODEL,final_age,final_gender,round(float(temperature),2),fanout]
+    spec+=[target_chapter] if k=="yt" else [blog_min,blog_imgs]
+    return k+":"+hashlib.sha256(json.dumps(spec,ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _pkg_inputs() -> dict:
+    # 부분 재생성이 같은 조건으로 호출하도록 결과와 함께 보관
+    return dict(tone=tone,mode=mode,model=MODEL,age=final_age,gender=final_gender,temperature=temperature,min_chars=blog_min)
+
+def _pkg_put(k:str, key:str, data:dict, topic:str, inputs:dict):
+    # 키·주제·입력은 제출 시점 값(백그라운드 작업이 끝날 때 화면 입력은 바뀌어 있을 수 있음)
+    pkgs=st.session_state.setdefault("pkgs",{})
+    pkgs.pop(key,None)
+    pkgs[key]={"data":data,"topic":topic,"ts":time.time(),"inputs":inputs}
+    while len(pkgs)>PKG_KEEP: pkgs.pop(next(iter(pkgs)))
+    st.session_state.setdefault("last_pkg",{})[k]=key
+
+def _pkg_get(k:str):
+    # 현재 입력의 결과, 없으면 이 대상의 마지막 결과(입력이 바뀐 뒤) → (키, pkg, 이전 입력 여부)
+    pkgs=st.session_state.get("pkgs",{})
+    if _pkg_key(k) in pkgs: return _pkg_key(k), pkgs[_pkg_key(k)], False
+    last=st.session_state.get("last_pkg",{}).get(k)
+    return (last, pkgs[last], True) if last in pkgs else (None, None, False)
+
+# ============== 부분 재생성 ==============
+# 항목 하나(챕터 · 블로그 섹션 · 제목 · 해시태그/태그 · 이미지 프롬프트)만 작은 호출로 다시 만들어 보관본에 끼움.
+# 버튼 on_click 콜백에서 처리 → 이어지는 재실행이 바뀐 보관본을 그린다. 생성 조건은 보관본의 inputs 사용.
+def _regen_items(k:str, data:dict) -> list:
+    if k=="yt":
+        return ([("titles","① 영상 제목 10개"),("hashtags","⑤ 해시태그")]+
+                [(("chapter",i),f"챕터 {i+1}: {c.get('title','')}") for i,c in enumerate(data.get("chapters",[]))])
+    return ([("titles","① 블로그 제목 10개"),("tags","④ 태그")]+
+            [(("section",h),f"섹션: {h}") for h in core.section_heads(data.get("body",""))]+
+            [(("image",i),f"이미지 프롬프트: {p.get('label','')}") for i,p in enumerate(data.get("images",[]))])
+
+def _regen(k:str, key:str, item, label:str):
+    pkg=st.session_state.get("pkgs",{}).get(key)
+    if not pkg: return
+    a=pkg["inputs"]
+    try:
+        core.set_api_key(_load_api_key())
+        kw=dict(age=a["age"],gender=a["gender"],temperature=a["temperature"])
+        if k=="yt": pkg["data"]=core.regen_youtube(pkg["data"],item,pkg["topic"],a["tone"],a["mode"],a["model"],**kw)
+        else:       pkg["data"]=core.regen_blog(pkg["data"],item,pkg["topic"],a["tone"],a["mode"],a["min_chars"],a["model"],**kw)
+        msg=("ok",f"✅ '{label}' 다시 만들었습니다.")
+    except Exception as e:
+        msg=("err",f"⚠️ '{label}' 재생성 실패 — 기존 내용 유지 ({type(e).__name__}: {e})")
+    st.session_state.setdefault("regen_msg",{})[k]=msg
+
+def regen_controls(k:str, key:str):
+    data=st.session_state["pkgs"][key]["data"]
+    items=_regen_items(k,data)
+    with st.expander("🔁 부분 재생성 — 마음에 안 드는 항목만 다시 만들기", expanded=k in st.session_state.get("regen_msg",{})):
+        c1,c2=st.columns([4,1])
+        sel=c1.selectbox("항목",range(len(items)),format_func=lambda i: items[i][1],key=f"regen_sel_{k}",
+                         label_visibility="collapsed")
+        sel=min(sel or 0,len(items)-1)
+        c2.button("다시 만들기",key=f"regen_btn_{k}",on_click=_regen,args=(k,key,items[sel][0],items[sel][1]))
+        msg=st.session_state.get("regen_msg",{}).pop(k,None)
+        if msg: (st.success if msg[0]=="ok" else st.error)(msg[1])
 
 # ============== 실행 ==============
+# 생성은 jobs 큐(프로세스 공용 워커 풀)에 대상별 작업으로 제출하고 세션은 바로 돌아온다 → 여러 사용자가 서로 막지 않음.
+# 진행 상태(대기 순번 · 경과 · 스트리밍 미리보기)는 대상 슬롯마다 st.fragment(run_every)로 폴링하고,
+# 끝나면 전체 재실행에서 결과를 보관본으로 옮겨 그린다. 한쪽 실패는 그쪽 슬롯에만 표시.
+# 작업 ID는 결과를 받을 때까지 URL 쿼리(job_yt · job_blog)에 남김 → 새로고침해도 진행 중 작업을 다시 찾는다.
+# 같은 입력으로 이미 만든 대상은 다시 요청하지 않고 보관본을 그린다(강제 재생성 체크 시 제외).
+RENDER={"yt":("📺 유튜브",render_youtube,preview_youtube),"blog":("📝 블로그",render_blog,preview_blog)}
+JOBS=jobs.get_queue()
+POLL_S=1.0
+
+if "u" not in st.query_params: st.query_params["u"]=uuid.uuid4().hex[:12]  # 탭(URL)별 임의 ID = 동시 작업 한도 단위 — 새 탭은 새 ID(로그인 없음). 같은 URL이면 작업 이어받기
+USER=st.query_params["u"]
+jobmap=st.session_state.setdefault("jobs",{})          # 대상 → 기다리는 작업 ID
+collected=st.session_state.setdefault("collected",set())
+for k in RENDER:  # 새로고침 직후(세션 새로 시작): URL의 작업 ID 복구
+    jid=st.query_params.get(f"job_{k}")
+    if jid and k not in jobmap and jid not in collected: jobmap[k]=jid
+
+do_yt = target in ["유튜브 + 블로그","유튜브만"]
+do_bl = target in ["유튜브 + 블로그","블로그만"]
+want=[k for k,on in (("yt",do_yt),("blog",do_bl)) if on]
+status=st.empty()
+slots={k:st.container() for k in want}
+
 if go:
     try:
-        do_yt = target in ["유튜브 + 블로그","유튜브만"]
-        do_bl = target in ["유튜브 + 블로그","블로그만"]
-
-        st.info("🔧 실행 중… (동기 처리)")
-        results={}
-
-        if do_yt:
-            st.write("📺 유튜브 생성 중…")
-            results["yt"]=gen_youtube(topic,tone,target_chapter,mode,MODEL)
-
-        if do_bl:
-            st.write("📝 블로그 생성 중…")
-            results["blog"]=gen_blog(topic,tone,mode,blog_min,blog_imgs,MODEL)
-
-        st.success("✅ 생성 완료")
-
-        # 유튜브
-        if do_yt:
-            yt=results.get("yt",{})
-            st.markdown("## 📺 유튜브 패키지")
-            copy_block("① 영상 제목(SEO 10)", "\n".join([f"{i+1}. {t}" for i,t in enumerate(yt.get("titles",[])[:10])]), 160)
-            copy_block("② 영상 설명", yt.get("description",""), 160)
-            chs=yt.get("chapters",[])[:target_chapter]
-            vrew="\n".join([(c.get("script","") or "").replace("\n"," ") for c in chs])
-            copy_block("③ 브루 자막 — 전체 일괄(Vrew)", vrew, 220)
-            if include_thumb:
-                copy_block("[썸네일] EN",
-                           img_en(f"YouTube thumbnail for topic: {topic}. Korean home context.",
-                                  final_age, final_gender, img_place, img_mood, img_shot, img_style), 110)
-            copy_block("⑤ 해시태그(20)", " ".join(yt.get("hashtags",[])), 90)
-            st.download_button("⬇️ 유튜브 패키지 .txt",
-                               build_youtube_txt(yt).encode("utf-8"),
-                               file_name="youtube_package.txt", mime="text/plain")
-
-        # 블로그
-        if do_bl:
-            blog=results.get("blog",{})
-            st.markdown("---"); st.markdown("## 📝 블로그 패키지")
-            copy_block("① 블로그 제목(SEO 10)", "\n".join([f"{i+1}. {t}" for i,t in enumerate(blog.get("titles",[])[:10])]), 160)
-            copy_block("② 본문 (이미지 앵커 포함)", blog.get("body",""), 420)
-            copy_block("②-β 본문+해시태그 (한 번에 복사)",
-                       f"{blog.get('body','').rstrip()}\n\n{join_tags(blog.get('tags',[]), tag_join)}", 460)
-            if blog.get("images"):
-                exp = st.expander("③ 이미지 프롬프트 (EN only, no text overlay)", expanded=False)
-                with exp:
-                    for p in blog.get("images",[]):
-                        base = p.get("en","") or f"support visual for section '{p.get('label','')}'"
-                        copy_block(f"[{p.get('label','이미지')}] EN",
-                                   img_en(base, final_age, final_gender, img_place, img_mood, img_shot, img_style), 110)
-            copy_block("④ 태그(20)", join_tags(blog.get("tags",[]), tag_join), 100)
-            st.download_button("⬇️ 블로그 패키지 .md",
-                               build_blog_md(blog).encode("utf-8"),
-                               file_name="blog_package.md", mime="text/markdown")
-
+        todo=[k for k in want if force_refresh or _pkg_key(k) not in st.session_state.get("pkgs",{})]
+        if not todo:
+            status.info("♻️ 같은 입력으로 만든 결과를 그대로 표시합니다. 새로 만들려면 '강제 재생성'을 체크하세요.")
+        else:
+            _client()  # 키 확인은 스크립트 스레드에서(워커에서 st.stop 방지)
+            if not health_ok():
+                st.error(f"⚠️ OpenAI API 연결 실패 — {st.session_state['health'][1]}")
+                st.stop()
+            opts=dict(age=final_age,gender=final_gender,temperature=temperature,refresh=force_refresh,fanout=fanout)
+            calls={"yt":(gen_youtube,topic,tone,target_chapter,mode,MODEL),
+                   "blog":(gen_blog,topic,tone,mode,blog_min,blog_imgs,MODEL)}
+            errs=st.session_state.setdefault("job_err",{})
+            for k in todo:
+                key=_pkg_key(k)
+                try:
+                    jid=JOBS.submit(USER,*calls[k],meta={"k":k,"key":key,"topic":topic,"inputs":_pkg_inputs()},
+                                    dedup=key,stream=stream_on,**opts)
+                except jobs.JobRejected as e:
+                    errs[k]=str(e); continue
+                jobmap[k]=jid; st.query_params[f"job_{k}"]=jid; errs.pop(k,None)
+            if len(errs)<len(todo): status.info("📥 백그라운드 작업으로 접수했습니다 — 새로고침하거나 다른 작업을 해도 계속 진행됩니다.")
     except Exception as e:
         st.error("⚠️ 실행 중 오류가 발생했습니다. 아래 로그 확인:")
         st.exception(e)
 
+# 끝난 작업 → 보관본(키·주제·입력은 제출 시점 값). 실패·취소·만료는 메시지만 남김
+for k,jid in list(jobmap.items()):
+    job=JOBS.get(jid,USER)
+    if job and job["state"] in jobs.ACTIVE: continue
+    jobmap.pop(k); collected.add(jid)
+    if st.query_params.get(f"job_{k}")==jid: del st.query_params[f"job_{k}"]  # 받은 결과는 세션 보관본 → 새로고침 때 다시 찾지 않음
+    if job and job["state"]=="done":
+        m=job["meta"]; _pkg_put(k,m["key"],job["result"],m["topic"],m["inputs"])
+    else:
+        st.session_state.setdefault("job_err",{})[k]=(job["error"] or "취소됨") if job else "작업 기록이 없습니다(만료 또는 서버 재시작)."
+
+@st.fragment(run_every=POLL_S)
+def job_status(k:str):
+    label,_,preview=RENDER[k]
+    jid=jobmap.get(k)
+    job=JOBS.get(jid,USER) if jid else None
+    if not job or job["state"] not in jobs.ACTIVE: st.rerun()  # 끝남 → 전체 재실행에서 보관본으로 옮겨 그림
+    if job["state"]=="queued":
+        c1,c2=st.columns([4,1])
+        c1.info(f"⏳ {label} 대기 중 — 앞에 {job['position']}건")
+        if c2.button("취소",key=f"job_cancel_{k}") and JOBS.cancel(jid,USER): st.rerun()
+    else:
+        st.info(f"🔧 {label} 생성 중… {time.time()-job['started']:.0f}초")
+        if job["partial"]: preview(job["partial"])
+
+for k in want:
+    with slots[k]:
+        err=st.session_state.get("job_err",{}).pop(k,None)
+        if err: st.error(f"⚠️ {RENDER[k][0]} 생성 실패 — {err}")
+        if k in jobmap: job_status(k); continue
+        key,pkg,stale=_pkg_get(k)
+        if not pkg: continue
+        if stale: st.caption(f"ℹ️ 이전 입력(주제: {pkg['topic']})으로 만든 결과입니다. 지금 입력으로 만들려면 ▶ 한 번에 생성")
+        RENDER[k][1](pkg["data"],pkg["topic"])
+        regen_controls(k,key)
+
+if show_admin:
+    st.markdown("---"); st.markdown("## 📊 운영 지표")
+    render_admin(st.selectbox("기간", [1,7,30,90], index=1, format_func=lambda d: f"최근 {d}일"))
+
 st.markdown("---")
-st.caption("동기 실행 · JSON 강제 · 재시도/모델 스위치 · 폴백 보장 · 세션 안전 접근 · 캐시/스레드/워치독 제거")
+st.caption("백그라운드 작업 큐 · 병렬 실행 · 스트리밍 미리보기 · 결과 세션 보관 · JSON 강제 · 재시도/모델 스위치 · 폴백 보장 · 세션 안전 접근 · 유튜브/블로그 병렬 생성")
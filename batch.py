@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# 배치 생성 CLI — 주제 목록(CSV/JSONL) → 유튜브/블로그 패키지 파일 (Streamlit 없이 core 재사용)
+#
+#   python batch.py topics.csv -o out/ -j 4 --rpm 60 --tpm 60000 --zip [--fanout]
+#
+# 행 컬럼: topic(필수) · tone · mode(info/sales/auto) · target(both/youtube/blog) · chapters · blog_min · blog_imgs · age · gender
+#   빈 칸은 앱 기본값. mode/target 은 앱 화면의 한글 라벨도 그대로 받음.
+# 이어하기: 완료된 행은 out/_checkpoint.jsonl 에 기록. 같은 명령을 다시 실행하면 그 행은 건너뜀.
+#   폴백 문구(업스트림 장애 시 안전본)가 섞인 행은 실패로 처리 → 기록하지 않으므로 다시 실행하면 새로 생성.
+
+import argparse, csv, json, os, re, sys, time, hashlib, threading, zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import core
+
+DEFAULTS = {"tone": "전문가형", "mode": "info", "target": "both", "chapters": 5,
+            "blog_min": 1800, "blog_imgs": 5, "age": "", "gender": ""}
+MODE_ALIAS   = {"정보형(블로그 지수)": "info", "시공후기형(영업)": "sales", "자동 분류": "auto"}
+TARGET_ALIAS = {"유튜브 + 블로그": "both", "유튜브만": "youtube", "블로그만": "blog"}
+CHECKPOINT = "_checkpoint.jsonl"
+
+# ============== 레이트 리밋(토큰 버킷) ==============
+# RPM·TPM 버킷 2개를 한 락으로 함께 검사해 둘 다 여유가 있을 때만 차감(한쪽만 깎이는 일 없음).
+# 토큰 수는 core.estimate_tokens(프롬프트) + max_tokens 로 보수적으로 잡는다.
+class TokenBucket:
+    def __init__(self, per_min: float):
+        self.rate = per_min / 60.0
+        self.cap = float(per_min)
+        self.tokens = self.cap
+        self.t = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.t) * self.rate)
+        self.t = now
+
+    def wait_for(self, n: float) -> float:
+        # n 만큼 쓰려면 몇 초 기다려야 하는지(0 = 바로 가능)
+        self._refill()
+        n = min(n, self.cap)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+class RateLimiter:
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self._b = [(TokenBucket(rpm), lambda t: 1) if rpm else None,
+                   (TokenBucket(tpm), lambda t: t) if tpm else None]
+        self._b = [b for b in self._b if b]
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        while True:
+            with self._lock:
+                w = max([b.wait_for(cost(tokens)) for b, cost in self._b] or [0.0])
+                if w == 0:
+                    for b, cost in self._b: b.tokens -= min(cost(tokens), b.cap)
+                    return
+            time.sleep(min(w, 5.0))
+
+# ============== 입력/체크포인트 ==============
+def load_rows(path: str) -> list:
+    with open(path, encoding="utf-8-sig") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(l) for l in f if l.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    out = []
+    for r in rows:
+        r = {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in r.items() if k}
+        if not r.get("topic"): continue
+        row = {**DEFAULTS, **{k: v for k, v in r.items() if v not in ("", None)}}
+        row["mode"]   = MODE_ALIAS.get(row["mode"], row["mode"])
+        row["target"] = TARGET_ALIAS.get(row["target"], row["target"])
+        for k in ("chapters", "blog_min", "blog_imgs"): row[k] = int(row[k])
+        out.append(row)
+    return out
+
+def row_id(row: dict) -> str:
+    h = hashlib.sha256(json.dumps(row, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+    slug = re.sub(r"[^\w가-힣]+", "_", row["topic"]).strip("_")[:40]
+    return f"{slug}-{h}"
+
+def load_done(out_dir: str) -> dict:
+    done, path = {}, os.path.join(out_dir, CHECKPOINT)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for l in f:
+                try: rec = json.loads(l)
+                except ValueError: continue  # 강제 종료로 잘린 마지막 줄
+                done[rec["id"]] = rec
+    return done
+
+_ck_lock = threading.Lock()
+def mark_done(out_dir: str, rec: dict):
+    with _ck_lock, open(os.path.join(out_dir, CHECKPOINT), "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.flush(); os.fsync(f.fileno())
+
+# ============== 실행 ==============
+class FallbackUsed(RuntimeError):
+    # 생성은 끝났지만 폴백 본문/조각이 들어감 → 완료로 기록하지 않음
+    pass
+
+def _checked(target: str, rep: dict):
+    if rep.get("fallback"): raise FallbackUsed(f"{target}: 응답 실패로 폴백 안전본 사용")
+    if rep.get("fallback_parts"): raise FallbackUsed(f"{target}: 조각 {rep['fallback_parts']}개가 폴백 문구")
+
+def run_row(row: dict, rid: str, args):
+    t0 = time.monotonic()
+    auto_age, auto_gender = core.detect_demo(row["topic"])
+    mode = core.classify_mode(row["topic"]) if row["mode"] == "auto" else row["mode"]
+    opts = dict(age=row["age"] or auto_age, gender=row["gender"] or auto_gender,
+                temperature=args.temperature, refresh=args.refresh, fanout=args.fanout)
+    d = os.path.join(args.out, rid)
+    os.makedirs(d, exist_ok=True)
+    files, pkg = [], {"row": row, "mode": mode}
+    if row["target"] in ("both", "youtube"):
+        rep = {}
+        pkg["youtube"] = yt = core.gen_youtube(row["topic"], row["tone"], row["chapters"], mode, args.model, report=rep, **opts)
+        _checked("youtube", rep)
+        files.append(_write(d, "youtube_package.txt", core.build_youtube_txt(yt)))
+    if row["target"] in ("both", "blog"):
+        rep = {}
+        pkg["blog"] = blog = core.gen_blog(row["topic"], row["tone"], mode, row["blog_min"], row["blog_imgs"],
+                                           args.model, report=rep, **opts)
+        _checked("blog", rep)
+        files.append(_write(d, "blog_package.md", core.build_blog_md(blog)))
+    files.append(_write(d, "package.json", json.dumps(pkg, ensure_ascii=False, indent=2)))
+    return files, time.monotonic() - t0
+
+def _write(d: str, name: str, text: str) -> str:
+    path = os.path.join(d, name)
+    with open(path, "w", encoding="utf-8") as f: f.write(text)
+    return os.path.join(os.path.basename(d), name)  # 출력 폴더 기준 상대경로
+
+def write_zip(out_dir: str, done: dict) -> str:
+    zpath = os.path.normpath(out_dir) + ".zip"
+    with zipfile.ZipFile(zpath, "w", zipfile.ZIP_DEFLATED) as z:
+        for rec in done.values():
+            for rel in rec.get("files", []):
+                p = os.path.join(out_dir, rel)
+                if os.path.exists(p): z.write(p, rel)
+    return zpath
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="주제 목록으로 유튜브/블로그 패키지 일괄 생성")
+    ap.add_argument("topics", help="CSV 또는 JSONL 파일")
+    ap.add_argument("-o", "--out", default="batch_out", help="출력 폴더(체크포인트 포함)")
+    ap.add_argument("-j", "--concurrency", type=int, default=3, help="동시 처리 행 수")
+    ap.add_argument("--rpm", type=float, default=float(os.getenv("OPENAI_RPM", "60")), help="분당 요청 한도(0=무제한)")
+    ap.add_argument("--tpm", type=float, default=float(os.getenv("OPENAI_TPM", "60000")), help="분당 토큰 한도(0=무제한)")
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--temperature", type=float, default=0.6)
+    ap.add_argument("--refresh", action="store_true", help="응답 캐시 무시하고 새로 생성")
+    ap.add_argument("--fanout", action="store_true", help="아웃라인 후 챕터/섹션 병렬 생성(긴 글 잘림 방지)")
+    ap.add_argument("--zip", action="store_true", help="완료 결과를 <out>.zip 으로 묶기")
+    args = ap.parse_args(argv)
+
+    if not core.api_key():
+        print("❌ OPENAI_API_KEY 미설정", file=sys.stderr); return 2
+    os.makedirs(args.out, exist_ok=True)
+    rows = load_rows(args.topics)
+    done = load_done(args.out)
+    todo = [(rid, r) for rid, r in {row_id(r): r for r in rows}.items() if rid not in done]  # 중복 행은 1번만
+    print(f"총 {len(rows)}건 · 완료 {len(rows)-len(todo)}건 건너뜀 · 남은 {len(todo)}건", file=sys.stderr)
+    if args.rpm or args.tpm: core.set_rate_limiter(RateLimiter(args.rpm, args.tpm))
+
+    failed = 0
+    ex = ThreadPoolExecutor(max_workers=max(1, args.concurrency))
+    try:
+        futs = {ex.submit(run_row, r, rid, args): (rid, r) for rid, r in todo}
+        for n, fut in enumerate(as_completed(futs), 1):
+            rid, r = futs[fut]
+            try:
+                files, secs = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{n}/{len(todo)}] ⚠️ {r['topic']} — {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            rec = {"id": rid, "topic": r["topic"], "files": files, "ts": time.time()}
+            mark_done(args.out, rec); done[rid] = rec
+            print(f"[{n}/{len(todo)}] ✅ {r['topic']} ({secs:.1f}s)", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("⏹ 중단 — 완료분은 체크포인트에 저장됨. 같은 명령으로 이어서 실행하세요.", file=sys.stderr)
+        ex.shutdown(wait=False, cancel_futures=True)
+        return 130
+    ex.shutdown()
+
+    if args.zip: print(f"📦 {write_zip(args.out, done)}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
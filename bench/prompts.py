@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# 프롬프트 토큰 리포트 — gen_* 가 실제로 보내는 system · user · 응답 스키마(response_format)를 호출 종류별로 셈
+# 네트워크 없음: OpenAI 클라이언트 자리에 요청을 기록하고 스텁 응답(fake_content)을 돌려주는 가짜를 끼움.
+# 토큰 수는 core.count_tokens(tiktoken 있으면 정확값, 없으면 대략치). schema 열은 JSON Schema 원문 기준이라
+# 상한 추정치(API는 스키마를 내부 형식으로 바꿔 넣음). 실제 청구량은 운영 지표의 prompt_tokens로 확인.
+#
+#   python -m bench.prompts                 # 단일 호출 + 분할 생성 모두
+#   python -m bench.prompts --json out.json
+
+import os, sys, json, types, argparse
+
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ["TELEMETRY_PATH"] = ""
+
+import core, telemetry
+from bench.stub_server import fake_content
+
+class _Recorder:
+    # client().chat.completions.create(...) 자리
+    def __init__(self):
+        self.reqs = []
+
+    @property
+    def chat(self): return self
+
+    @property
+    def completions(self): return self
+
+    def create(self, **kw):
+        self.reqs.append({**kw, "_schema": (telemetry.current() or {}).get("schema")})  # 호출 span의 스키마 이름
+        msg = types.SimpleNamespace(content=fake_content(kw))
+        return types.SimpleNamespace(usage=None, choices=[types.SimpleNamespace(message=msg, finish_reason="stop")])
+
+def _kind(kw: dict) -> str:
+    return kw["_schema"] or (kw.get("response_format") or {}).get("type", "?")
+
+def report(model: str = "gpt-4o-mini") -> dict:
+    rec = _Recorder()
+    core.set_api_key("report")
+    core._clients["report"] = rec
+    policy = core.RetryPolicy(hedge_pct=0)
+    try:
+        for fan in (False, True):
+            core.gen_youtube("보일러 교체 비용", "전문가형", 5, "info", model, policy=policy, fanout=fan)
+            core.gen_blog("보일러 교체 비용", "전문가형", "info", 1800, 5, model, policy=policy, fanout=fan)
+    finally:
+        core._clients.pop("report", None)
+    rows = {}
+    for kw in rec.reqs:
+        m = kw["messages"]
+        rf = kw.get("response_format") or {}
+        r = rows.setdefault(_kind(kw), {"calls": 0, "system": 0, "user": 0, "schema": 0, "max_tokens": 0})
+        r["calls"] += 1
+        r["system"] += core.count_tokens(m[0]["content"], model)
+        r["user"] += core.count_tokens(m[1]["content"], model)
+        r["schema"] += core.count_tokens(json.dumps(rf["json_schema"], ensure_ascii=False, separators=(",", ":")), model) if "json_schema" in rf else 0
+        r["max_tokens"] = max(r["max_tokens"], kw.get("max_tokens") or 0)
+    for r in rows.values():  # 호출 1건 평균
+        for k in ("system", "user", "schema"): r[k] = round(r[k] / r["calls"])
+        r["input"] = r["system"] + r["user"] + r["schema"]
+    return rows
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="프롬프트 토큰 리포트(호출 종류별 평균)")
+    ap.add_argument("--model", default="gpt-4o-mini")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args(argv)
+    rows = report(args.model)
+    cols = ["calls", "system", "user", "schema", "input", "max_tokens"]
+    print(f"{'kind':<16}" + "".join(f"{c:>12}" for c in cols))
+    for kind, r in rows.items():
+        print(f"{kind:<16}" + "".join(f"{r[c]:>12}" for c in cols))
+    print(f"토큰 계산: {core.TOKEN_COUNTER} · strict 스키마: {'켜짐' if core.STRICT_OUTPUT else '꺼짐(JSON 모드 + 프롬프트 예시)'}",
+          file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(rows, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
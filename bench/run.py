@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# 오프라인 벤치마크 — 로컬 스텁 서버로 call_json · gen_* · validate/parse_json · 내보내기 경로를 시나리오별로 측정
+#
+#   python -m bench.run                      # 전체 시나리오 실행 + 기준선 비교(회귀 시 종료코드 1)
+#   python -m bench.run -s clean truncated   # 일부만
+#   python -m bench.run -r 3                 # 시나리오마다 3번 돌려 지표별 중앙값으로 비교
+#   python -m bench.run --update-baseline    # 중앙값(기본 5회)을 bench/baseline.json 으로 저장 + 바뀐 지표 출력
+#                                            # 기준선을 다시 잡는 커밋에는 출력된 변화와 그 이유를 적을 것
+#
+# 시나리오: bench/scenarios.json (stub=스텁 동작, policy=RetryPolicy 덮어쓰기, workload=실행량)
+#   workload.workers 가 있으면 gen_* 를 jobs 큐(워커 수 고정) 경유로 실행 — concurrency = 동시 사용자 수
+# 판정 기준: bench/thresholds.json. 지표는 모두 낮을수록 좋음.
+# 캐시·텔레메트리 파일은 끄고 실행(측정이 디스크 상태에 좌우되지 않게). 계측은 telemetry 싱크로 메모리 수집.
+
+import os, sys, json, time, random, argparse, threading, statistics
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ["TELEMETRY_PATH"] = ""
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+import core, jobs, telemetry
+from bench.stub_server import StubServer, Scenario, fake_content
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "baseline.json")
+
+def _load(name: str) -> dict:
+    with open(os.path.join(HERE, name), encoding="utf-8") as f: return json.load(f)
+
+# ============== CPU 계측(스레드별 CPU 시간) ==============
+# 측정 대상 함수를 감싸 thread_time() 증가분을 누적. 벤치 실행 동안만 교체했다가 되돌린다.
+class CpuMeter:
+    def __init__(self):
+        self.ms, self._lock = {}, threading.Lock()
+
+    def wrap(self, name: str, fn):
+        def timed(*a, **kw):
+            t0 = time.thread_time()
+            try: return fn(*a, **kw)
+            finally:
+                with self._lock: self.ms[name] = self.ms.get(name, 0.0) + (time.thread_time() - t0) * 1000
+        return timed
+
+def _pct(xs, q):
+    return telemetry.pct(xs, q) or 0.0
+
+# ============== 시나리오 실행 ==============
+def run_scenario(srv: StubServer, cfg: dict) -> dict:
+    sc = Scenario(); sc.update(cfg.get("stub")); srv.set_scenario(sc)
+    policy = core.RetryPolicy(**cfg.get("policy", {}))
+    w = cfg["workload"]; target = w.get("target", "both")
+    core.LATENCY = core._Latency()  # 헤지 임계값이 이전 시나리오에 끌려가지 않게
+    random.seed(sc.seed)            # 백오프 jitter 재현
+
+    recs, lock = [], threading.Lock()
+    def sink(rec):
+        with lock: recs.append(rec)
+    cpu = CpuMeter()
+    orig = {"validate": core.validate, "feed": core.JsonStream.feed}
+    core.validate = cpu.wrap("parse", orig["validate"])  # JSON 파싱 + 스키마 검증
+    core.JsonStream.feed = cpu.wrap("stream_parse", orig["feed"])
+    telemetry.add_sink(sink)
+
+    jq = jobs.JobQueue(workers=w["workers"], maxsize=w.get("runs", 4) * 2) if w.get("workers") else None
+    def gen(user, fn, *a, **kw):
+        return jq.wait(jq.submit(user, fn, *a, **kw)) if jq else fn(*a, **kw)
+
+    e2e = []
+    def one(i):
+        t0 = time.perf_counter()
+        cb = (lambda snap: None) if w.get("stream") else None
+        topic, fan, user = f"벤치 주제 {i}", w.get("fanout", False), f"user{i}"
+        if target in ("both", "youtube"):
+            yt = gen(user, core.gen_youtube, topic, "전문가형", 5, "info", "gpt-4o-mini", cb, policy=policy, fanout=fan)
+            cpu.wrap("render", core.build_youtube_txt)(yt)
+        if target in ("both", "blog"):
+            blog = gen(user, core.gen_blog, topic, "전문가형", "info", 1800, 5, "gpt-4o-mini", cb, policy=policy, fanout=fan)
+            cpu.wrap("render", core.build_blog_md)(blog)
+        with lock: e2e.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=w.get("concurrency", 1)) as ex:
+            list(ex.map(one, range(w.get("runs", 4))))
+    finally:
+        telemetry.remove_sink(sink)
+        if jq: jq.close()
+        core.validate, core.JsonStream.feed = orig["validate"], orig["feed"]
+    wall = time.perf_counter() - t0
+
+    calls = [r for r in recs if r["kind"] == "call" and r.get("cache") != "hit"]
+    gens = [r for r in recs if r["kind"] == "gen"]
+    n_gen = max(1, len(gens))
+    return {
+        "e2e_p50_ms": round(_pct(e2e, .5), 1),
+        "e2e_p95_ms": round(_pct(e2e, .95), 1),
+        "calls_per_gen": round(len(calls) / n_gen, 3),
+        "attempts_per_call": round(sum(r.get("attempts", 0) for r in calls) / max(1, len(calls)), 3),
+        "tokens_per_gen": round(sum((r.get("prompt_tokens") or 0) + (r.get("completion_tokens") or 0) for r in gens) / n_gen),
+        "fallback_rate": round(sum(bool(r.get("fallback")) for r in gens) / n_gen, 3),
+        "model_switch_rate": round(sum(bool(r.get("model_switch")) for r in gens) / n_gen, 3),
+        "parse_cpu_ms_per_gen": round((cpu.ms.get("parse", 0) + cpu.ms.get("stream_parse", 0)) / n_gen, 3),
+        "render_cpu_ms_per_gen": round(cpu.ms.get("render", 0) / n_gen, 3),
+        "stub_requests": srv.requests,
+        "wall_s": round(wall, 2),
+    }
+
+# ============== 파서 마이크로벤치 ==============
+def parse_micro(n: int = 2000) -> dict:
+    yt = fake_content({"messages": [{"role": "user", "content": "[topic]벤치\n[N]7"}]})
+    cases = {"valid": yt, "truncated": yt[:len(yt)*2//3], "malformed": "설명 문장 " * 200 + "{not json"}
+    out = {}
+    for name, s in cases.items():
+        t0 = time.thread_time()
+        for _ in range(n): core.parse_json(s, {})
+        out[f"parse_us_{name}"] = round((time.thread_time() - t0) / n * 1e6, 2)
+    return out
+
+# ============== 반복(중앙값) ==============
+# 지연 지표는 한 번 실행으론 흔들림이 커서 기준선·판정이 운에 좌우됨 → 같은 시나리오를 n번 돌려 지표별 중앙값
+def _median(runs: list) -> dict:
+    return {k: round(statistics.median(r[k] for r in runs), 3) for k in runs[0]}
+
+def repeated(fn, n: int) -> dict:
+    return _median([fn() for _ in range(max(1, n))])
+
+# ============== 비교 ==============
+def compare(results: dict, baseline: dict, th: dict) -> list:
+    bad = []
+    for scen, cur in results.items():
+        base = baseline.get(scen) or {}
+        for k, v in cur.items():
+            t = th.get(k)
+            if not t or k not in base: continue
+            limit = base[k] * t.get("ratio", 1.0) + t.get("slack", 0.0)
+            if v > limit: bad.append((scen, k, base[k], v, limit))
+    return bad
+
+def moved(results: dict, baseline: dict, th: dict, min_change: float = 0.05) -> list:
+    # 기준선 갱신 시 바뀐 지표(판정 대상 지표 중 min_change 넘게 변한 것)
+    out = []
+    for scen, cur in results.items():
+        base = baseline.get(scen) or {}
+        for k, v in cur.items():
+            b = base.get(k)
+            if k in th and b not in (None, 0) and abs(v - b) / b > min_change:
+                out.append((scen, k, b, v))
+    return out
+
+def _table(results: dict, baseline: dict):
+    keys = ["e2e_p50_ms", "e2e_p95_ms", "calls_per_gen", "attempts_per_call", "tokens_per_gen", "fallback_rate",
+            "model_switch_rate", "parse_cpu_ms_per_gen", "render_cpu_ms_per_gen"]
+    print(f"{'scenario':<16}" + "".join(f"{k[:18]:>20}" for k in keys))
+    for scen, cur in results.items():
+        if scen == "parse_micro": continue
+        base = baseline.get(scen, {})
+        cells = []
+        for k in keys:
+            v, b = cur.get(k), base.get(k)
+            cells.append(f"{v}" + (f" ({(v-b)/b:+.0%})" if b not in (None, 0) else ""))
+        print(f"{scen:<16}" + "".join(f"{c:>20}" for c in cells))
+    if "parse_micro" in results:
+        print("parse_micro     " + "  ".join(f"{k}={v}µs" for k, v in results["parse_micro"].items()))
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="오프라인 벤치마크(스텁 서버)")
+    ap.add_argument("-s", "--scenarios", nargs="*", help="실행할 시나리오 이름(기본: 전체)")
+    ap.add_argument("-r", "--repeat", type=int, help="시나리오별 반복 횟수(지표별 중앙값). 기본 1, --update-baseline 이면 5")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--json", help="결과를 JSON 파일로 저장")
+    args = ap.parse_args(argv)
+
+    scen = _load("scenarios.json")
+    names = args.scenarios or list(scen)
+    n = args.repeat or (5 if args.update_baseline else 1)
+    srv = StubServer().start()
+    os.environ["OPENAI_BASE_URL"] = srv.base_url
+    core._clients.clear()  # base_url 반영해 새로 만들게
+    results = {}
+    try:
+        for name in names:
+            print(f"▶ {name} …" + (f" ×{n}" if n > 1 else ""), file=sys.stderr, flush=True)
+            results[name] = repeated(lambda: run_scenario(srv, scen[name]), n)
+        results["parse_micro"] = repeated(parse_micro, n)
+    finally:
+        srv.stop()
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding="utf-8") as f: baseline = json.load(f)
+    _table(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f: json.dump(results, f, ensure_ascii=False, indent=2)
+    th = _load("thresholds.json")
+    if args.update_baseline:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump({**baseline, **results}, f, ensure_ascii=False, indent=2); f.write("\n")
+        for scen_, k, b, v in moved(results, baseline, th):
+            print(f"  {scen_}.{k}: {b} → {v} ({(v-b)/b:+.0%})", file=sys.stderr)
+        print(f"기준선 저장: {BASELINE} (중앙값 ×{n})", file=sys.stderr)
+        return 0
+
+    bad = compare(results, baseline, th)
+    for scen_, k, b, v, lim in bad:
+        print(f"❌ 회귀: {scen_}.{k} = {v} (기준 {b}, 허용 ≤ {lim:.2f})", file=sys.stderr)
+    if not baseline: print("기준선 없음 — --update-baseline 으로 먼저 저장하세요.", file=sys.stderr)
+    elif not bad: print("✅ 기준선 대비 회귀 없음", file=sys.stderr)
+    return 1 if bad else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
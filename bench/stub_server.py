@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# OpenAI 호환 로컬 스텁 서버 — 벤치마크/오프라인 점검용 (실제 API 호출 없음)
+#   GET  /v1/models
+#   POST /v1/chat/completions   (stream 포함, SSE)
+#   POST /_scenario             (실행 중 동작 변경: 아래 Scenario 필드 JSON)
+#
+# 응답 내용은 프롬프트를 보고 유튜브/블로그 형태(분할 생성이면 아웃라인/챕터/섹션, 복구·재생성이면 요청 필드)의 그럴듯한 JSON을 만든다.
+# 지연·오류(429/500)·타임아웃(응답 지연)·잘린 JSON·형식 불량을 확률로 주입. seed 고정이면 재현 가능.
+#
+#   python -m bench.stub_server --port 8765 --latency-ms 400 --p429 0.2
+
+import re, json, time, random, argparse, threading
+from dataclasses import dataclass, asdict, fields
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+@dataclass
+class Scenario:
+    latency_ms: float = 300.0     # 응답 전체(비스트림) 또는 첫 토큰까지(스트림) 평균 지연
+    jitter_ms: float = 50.0
+    chunk_ms: float = 2.0         # 스트림 청크 간격
+    tok_ms: float = 0.0           # 출력 토큰(≈2자)당 생성 시간 — 긴 응답일수록 느린 실제 API 흉내
+    p429: float = 0.0
+    retry_after_s: float = 0.0    # 429 응답의 Retry-After(0 = 헤더 없음)
+    p500: float = 0.0
+    p_timeout: float = 0.0        # 이 확률로 hang_s 동안 응답 지연(클라이언트 타임아웃 유도)
+    hang_s: float = 5.0
+    p_truncate: float = 0.0       # JSON을 중간에서 자르고 finish_reason=length
+    p_malformed: float = 0.0      # JSON이 아닌 문장 / 엉뚱한 형태
+    seed: int = 7
+
+    def update(self, d: dict):
+        names = {f.name for f in fields(self)}
+        for k, v in (d or {}).items():
+            if k in names: setattr(self, k, type(getattr(self, k))(v))
+
+# ============== 가짜 응답 ==============
+def _yt_payload(n: int, topic: str) -> dict:
+    return {"youtube": {
+        "titles": [f"{topic} 제목 {i+1}" for i in range(10)],
+        "description": f"{topic}에 대해 현장 기준으로 정리했습니다. " * 4,
+        "chapters": [{"title": f"챕터 {i+1}", "script": f"{topic} 핵심 포인트 {i+1}. " + "현장에서 자주 보는 사례입니다. " * 12}
+                     for i in range(n)],
+        "images": {"thumbnail": {"en": "Korean home thumbnail, no text"},
+                   "chapters": [{"index": i+1, "en": f"support visual {i+1}"} for i in range(n)]},
+        "hashtags": [f"#태그{i+1}" for i in range(20)]}}
+
+def _blog_body(topic: str, min_chars: int) -> str:
+    parts = [f"## {topic}", "서론입니다. " * 20, "### 핵심 5가지", "\n".join(f"{i}) 포인트 설명 " * 3 for i in range(1, 6)),
+             "### 체크리스트", "\n".join(f"- 항목 {i}" for i in range(1, 8)), "### 자가진단",
+             "\n".join(f"- 질문 {i}" for i in range(1, 6)), "### FAQ", "- Q1 A1\n- Q2 A2\n- Q3 A3",
+             "### 마무리", "정리합니다. " * 10, "[이미지:대표]\n[이미지:본문1]\n[이미지:본문2]"]
+    body = "\n\n".join(parts)
+    while len(body) < min_chars:  # 분량은 핵심 5가지에서 늘림(잘림 시나리오가 본문 중간에서 끊기게)
+        body = body.replace("포인트 설명 ", "포인트 설명 현장 디테일을 덧붙입니다. ", 1) + " "
+    return body
+
+def _blog_payload(min_chars: int, topic: str) -> dict:
+    return {"blog": {"titles": [f"{topic} 블로그 {i+1}" for i in range(10)],
+                     "body": _blog_body(topic, min_chars),
+                     "images": [{"label": "대표" if i == 0 else f"본문{i}", "en": f"visual {i}"} for i in range(5)],
+                     "tags": [f"#태그{i+1}" for i in range(20)]}}
+
+def _part_payload(part: str, user: str, topic: str) -> dict:
+    # 분할 생성 요청: 아웃라인(유튜브 [N] 있음 / 블로그) · 챕터 스크립트 · 블로그 섹션
+    n = re.search(r"\[N\](\d+)", user)
+    chars = int((re.search(r"\[chars\](\d+)", user) or [None, "400"])[1])
+    if part == "outline" and n:
+        yt = _yt_payload(int(n.group(1)), topic)["youtube"]
+        for c in yt["chapters"]: c.pop("script")
+        return yt
+    if part == "outline":
+        b = _blog_payload(0, topic)["blog"]
+        return {"titles": b["titles"], "points": [f"포인트 {i}" for i in range(1, 6)], "images": b["images"], "tags": b["tags"]}
+    if part == "image":
+        return {"en": f"new visual for {topic}, no text overlay"}
+    if part in ("repair", "regen"):  # 빠진/요청한 필드만(챕터는 요청한 번호 범위만)
+        miss = [k.strip() for k in (re.search(r"\[(?:missing|fields)\](.*)", user) or [None, ""])[1].split(",") if k.strip()]
+        full = _yt_payload(int(n.group(1)), topic)["youtube"] if n else _blog_payload(0, topic)["blog"]
+        out = {k: full[k] for k in miss if k in full}
+        rng = re.search(r"chapters는 (\d+)~(\d+)번", user)
+        if rng and "chapters" in out: out["chapters"] = out["chapters"][int(rng.group(1))-1:int(rng.group(2))]
+        return out
+    text = f"{topic} 현장에서 자주 보는 사례입니다. "
+    return {"script" if part == "chapter" else "text": text * (chars // len(text) + 1)}
+
+def fake_content(req: dict) -> str:
+    msgs = req.get("messages") or []
+    sys_ = next((m["content"] for m in msgs if m.get("role") == "system"), "")
+    user = next((m["content"] for m in msgs if m.get("role") == "user"), "")
+    topic = (re.search(r"\[topic\](.*)", user) or [None, "주제"])[1].strip()
+    part = re.search(r"\[part\](\w+)", user)
+    if part: return json.dumps(_part_payload(part.group(1), user, topic), ensure_ascii=False)
+    n = re.search(r"\[N\](\d+)", user)
+    if n: return json.dumps(_yt_payload(int(n.group(1)), topic), ensure_ascii=False)
+    m = re.search(r"길이>=(\d+)", sys_)
+    return json.dumps(_blog_payload(int(m.group(1)) if m else 1500, topic), ensure_ascii=False)
+
+# ============== 서버 ==============
+class StubServer:
+    def __init__(self, port: int = 0, scenario: Scenario = None):
+        self.scenario = scenario or Scenario()
+        self.rng = random.Random(self.scenario.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        self._t = None
+
+    def set_scenario(self, sc: Scenario):
+        with self.lock:
+            self.scenario, self.rng, self.requests = sc, random.Random(sc.seed), 0
+
+    def draw(self) -> dict:
+        # 요청 1건의 운명을 결정(한 락 안에서 → seed 고정 시 요청 순서대로 재현)
+        with self.lock:
+            sc, r = self.scenario, self.rng
+            self.requests += 1
+            fate = "ok"
+            for name, p in (("timeout", sc.p_timeout), ("429", sc.p429), ("500", sc.p500),
+                            ("truncate", sc.p_truncate), ("malformed", sc.p_malformed)):
+                if p and r.random() < p: fate = name; break
+            lat = max(0.0, r.gauss(sc.latency_ms, sc.jitter_ms)) / 1000
+            return {"fate": fate, "latency": lat, "cut": r.uniform(0.3, 0.9), "sc": sc}
+
+    def start(self):
+        self._t = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._t.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown(); self.httpd.server_close()
+
+def _handler(srv: StubServer):
+    class H(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive (클라이언트 커넥션 풀 재사용 경로 그대로)
+
+        def log_message(self, *a):
+            pass
+
+        def _json(self, code: int, obj, headers=None):
+            b = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(b)))
+            for k, v in (headers or {}).items(): self.send_header(k, v)
+            try:
+                self.end_headers(); self.wfile.write(b)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 클라이언트가 타임아웃으로 끊음
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                return self._json(200, {"object": "list", "data": [{"id": m, "object": "model", "created": 0, "owned_by": "stub"}
+                                                                    for m in ("gpt-4o-mini", "gpt-4o")]})
+            self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("content-length") or 0))
+            try: req = json.loads(body or b"{}")
+            except ValueError: return self._json(400, {"error": {"message": "bad json"}})
+            if self.path.startswith("/_scenario"):
+                sc = Scenario(); sc.update(req); srv.set_scenario(sc)
+                return self._json(200, asdict(sc))
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+            d = srv.draw(); sc = d["sc"]
+            if d["fate"] == "timeout":
+                time.sleep(sc.hang_s)
+            time.sleep(d["latency"])
+            if d["fate"] == "429":
+                h = {"retry-after": str(sc.retry_after_s)} if sc.retry_after_s else {}
+                return self._json(429, {"error": {"message": "rate limited", "type": "requests", "code": "rate_limit_exceeded"}}, h)
+            if d["fate"] == "500":
+                return self._json(500, {"error": {"message": "stub server error", "type": "server_error"}})
+            content, finish = fake_content(req), "stop"
+            if d["fate"] == "truncate":
+                content, finish = content[:int(len(content) * d["cut"])], "length"
+            elif d["fate"] == "malformed":
+                content = "죄송합니다. 요청하신 내용을 정리하면 다음과 같습니다: 제목, 설명, 챕터…"
+            usage = {"prompt_tokens": sum(len(m.get("content", "")) for m in req.get("messages", [])) // 2,
+                     "completion_tokens": len(content) // 2}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            if req.get("stream"): return self._stream(req, content, finish, usage, sc)
+            if sc.tok_ms: time.sleep(usage["completion_tokens"] * sc.tok_ms / 1000)
+            self._json(200, {"id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                             "model": req.get("model"), "usage": usage,
+                             "choices": [{"index": 0, "finish_reason": finish,
+                                          "message": {"role": "assistant", "content": content}}]})
+
+        def _stream(self, req, content, finish, usage, sc):
+            self.send_response(200)
+            self.send_header("content-type", "text/event-stream")
+            self.send_header("transfer-encoding", "chunked")
+            self.end_headers()
+            base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": req.get("model")}
+
+            def send(obj):
+                data = (f"data: {json.dumps(obj, ensure_ascii=False)}\n\n" if obj is not None else "data: [DONE]\n\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n"); self.wfile.flush()
+
+            try:
+                for i in range(0, len(content), 24):
+                    send({**base, "choices": [{"index": 0, "delta": {"content": content[i:i+24]}, "finish_reason": None}]})
+                    if sc.chunk_ms or sc.tok_ms: time.sleep((sc.chunk_ms + 12 * sc.tok_ms) / 1000)
+                send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+                if (req.get("stream_options") or {}).get("include_usage"):
+                    send({**base, "choices": [], "usage": usage})
+                send(None)
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 클라이언트가 타임아웃으로 끊음
+
+    return H
+
+def main():
+    ap = argparse.ArgumentParser(description="OpenAI 호환 스텁 서버")
+    ap.add_argument("--port", type=int, default=8765)
+    for f in fields(Scenario):
+        ap.add_argument("--" + f.name.replace("_", "-"), type=type(f.default), default=f.default)
+    a = vars(ap.parse_args())
+    srv = StubServer(a.pop("port"), Scenario(**a))
+    print(f"stub: {srv.base_url}  (OPENAI_BASE_URL 로 지정)")
+    try: srv.httpd.serve_forever()
+    except KeyboardInterrupt: srv.stop()
+
+if __name__ == "__main__":
+    main()
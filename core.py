@@ -0,0 +1,1102 @@
+# -*- coding: utf-8 -*-
+# 생성 코어 — Streamlit 비의존(앱·배치 CLI 공용)
+# OpenAI 클라이언트 · JSON 파싱 · 응답 캐시 · LLM 호출 · 스키마/폴백 · 생성 · 내보내기
+# UI 상태(사이드바 값 등)는 읽지 않는다. 필요한 값은 전부 인자로 받는다.
+
+import os, re, json, time, random, hashlib, sqlite3, threading, contextvars
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED, TimeoutError as FutureTimeout
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
+import httpx
+import openai
+from openai import OpenAI
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, create_model
+
+import telemetry
+
+# ============== 기본 ==============
+KST = timezone(timedelta(hours=9))
+CTA = "강쌤철물 집수리 관악점에 지금 바로 문의주세요. 상담문의: 010-2276-8163"
+
+# ============== OpenAI ==============
+# 프로세스당 클라이언트 1개 공유(keep-alive 커넥션 풀 재사용 → 호출마다 TLS 핸드셰이크 제거)
+OPENAI_TIMEOUT = 50
+POOL_MAX_CONN  = int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "20"))
+POOL_KEEPALIVE = int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "10"))
+POOL_EXPIRY_S  = float(os.getenv("OPENAI_POOL_KEEPALIVE_EXPIRY", "120"))
+
+_api_key = ""
+_clients = {}
+_clients_lock = threading.Lock()
+_limiter = None
+
+def set_api_key(api_key: str):
+    # 앱은 Streamlit Secrets에서 읽은 키를 여기로 넘김. 미설정이면 OPENAI_API_KEY 환경변수
+    global _api_key
+    _api_key = api_key or ""
+
+def api_key() -> str:
+    return _api_key or os.getenv("OPENAI_API_KEY", "")
+
+def client() -> OpenAI:
+    ak = api_key()
+    if not ak: raise RuntimeError("OPENAI_API_KEY 미설정")
+    with _clients_lock:
+        if ak not in _clients:
+            http = httpx.Client(
+                timeout=OPENAI_TIMEOUT,
+                limits=httpx.Limits(max_connections=POOL_MAX_CONN,
+                                    max_keepalive_connections=POOL_KEEPALIVE,
+                                    keepalive_expiry=POOL_EXPIRY_S),
+            )
+            _clients[ak] = OpenAI(api_key=ak, timeout=OPENAI_TIMEOUT, http_client=http,
+                                  max_retries=0)  # 재시도는 RetryPolicy가 전담
+        return _clients[ak]
+
+def set_rate_limiter(limiter):
+    # limiter.acquire(tokens) 를 매 요청 전에 호출(배치의 RPM/TPM 토큰 버킷). None = 제한 없음
+    global _limiter
+    _limiter = limiter
+
+def estimate_tokens(text: str) -> int:
+    # 대략치: 한글 1자 ≈ 1토큰, 그 외 ≈ 4자/토큰
+    t = text or ""
+    ko = len(re.findall(r"[\uac00-\ud7a3]", t))
+    return ko + (len(t) - ko) // 4 + 1
+
+try:  # 선택 의존성: 있으면 정확한 토큰 수, 없으면 estimate_tokens 대략치
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try: return tiktoken.encoding_for_model(model)
+    except KeyError: return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    if tiktoken is None: return estimate_tokens(text)
+    return len(_encoding(model).encode(text or ""))
+
+TOKEN_COUNTER = "tiktoken" if tiktoken else "heuristic"
+
+# ============== JSON ==============
+_decoder = json.JSONDecoder()
+
+def _first_json(s: str):
+    # 첫 '{'부터 완결된 JSON 값 하나만 읽음(raw_decode) → (값, 시작, 끝). 앞뒤 설명문·코드펜스는 무시.
+    # 탐욕 정규식(\{.*\})과 달리 뒤에 붙은 다른 중괄호까지 삼키지 않고, 잘린 JSON 안쪽 객체를 답으로 오인하지 않음
+    if not isinstance(s, str): return None, -1, -1
+    i = s.find("{")
+    if i < 0: return None, -1, -1
+    try:
+        v, j = _decoder.raw_decode(s, i)
+        return v, i, j
+    except ValueError:
+        return None, -1, -1
+
+def find_json(s: str) -> str:
+    _, i, j = _first_json(s)
+    return s[i:j] if i >= 0 else ""
+
+def parse_json(s: str, fallback: dict) -> dict:
+    v, _, _ = _first_json(s)
+    return v if isinstance(v, dict) and v else fallback
+
+# 스트리밍용 증분 JSON 파서: 조각(chunk)을 이어 받으며 문자 단위 상태(괄호 스택/문자열/이스케이프)를
+# 유지하므로 전체 재스캔이 없다. 마지막으로 "닫힌 값" 위치와 그 시점의 닫는 괄호열을 기억해 두고,
+# snapshot()은 그 지점까지 잘라 괄호를 닫은 유효 JSON을 돌려준다.
+class JsonStream:
+    def __init__(self):
+        self.buf = ""
+        self.done = False
+        self._pos = 0; self._start = -1
+        self._stack = []                  # [괄호, 키 차례 여부]
+        self._in_str = False; self._esc = False; self._is_key = False
+        self._safe = 0; self._close = ""  # 마지막 안전 지점 / 그때의 닫는 괄호열
+
+    def _closers(self) -> str:
+        return "".join("}" if b=="{" else "]" for b,_ in reversed(self._stack))
+
+    def _mark(self, pos: int):
+        self._safe, self._close = pos, self._closers()
+
+    def feed(self, chunk: str) -> bool:
+        # 값이 하나라도 닫혔거나(또는 열린 문자열 값에 줄바꿈이 생겼으면) True
+        self.buf += chunk or ""
+        changed = False
+        for i in range(self._pos, len(self.buf)):
+            if self.done: break
+            c = self.buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                    if c == "n" and not self._is_key: changed = True
+                elif c == "\\": self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if not self._is_key: self._mark(i+1); changed = True
+                continue
+            if self._start < 0:              # 여는 중괄호 이전 잡음은 건너뜀
+                if c == "{": self._start = i; self._stack.append(["{", True])
+                continue
+            top = self._stack[-1] if self._stack else None
+            if c == '"':
+                self._in_str = True
+                self._is_key = bool(top and top[0] == "{" and top[1])
+            elif c in "{[":
+                self._stack.append([c, c == "{"])
+            elif c in "}]":
+                if self._stack: self._stack.pop()
+                self._mark(i+1); changed = True
+                if not self._stack: self.done = True
+            elif c == ":":
+                if top: top[1] = False
+            elif c == ",":
+                if top and top[0] == "{": top[1] = True
+                self._mark(i); changed = True   # 숫자/true/false/null 값은 쉼표에서 닫힘
+        self._pos = len(self.buf)
+        return changed
+
+    def snapshot(self, partial: bool = False) -> dict:
+        # partial=True: 지금 쓰이는 중인 문자열 값도 닫아서 포함
+        if self._start < 0: return {}
+        if partial and self._in_str and not self._is_key:
+            tail = self.buf[self._start:len(self.buf) - (1 if self._esc else 0)]
+            tail = re.sub(r"\\u[0-9a-fA-F]{0,3}$", "", tail)  # 잘린 \u 이스케이프
+            try:
+                v = json.loads(tail + '"' + self._closers())
+                if isinstance(v, dict): return v
+            except ValueError:
+                pass
+        if self._safe <= self._start: return {}
+        try:
+            v = json.loads(self.buf[self._start:self._safe] + self._close)
+            return v if isinstance(v, dict) else {}
+        except ValueError:
+            return {}
+
+# ============== 응답 캐시(SQLite, 디스크 영속) ==============
+# 키 = sha256(스키마 버전, 모델, temperature, system, user). Streamlit 재시작 후에도 유지.
+# 항목별 TTL + 전체 크기 초과 시 최근 사용(used)이 오래된 것부터 제거(LRU).
+SCHEMA_VERSION = "v3"   # 스키마/프롬프트 구조를 바꾸면 올릴 것(기존 캐시 자동 무효화). v3: 형태 불량 응답이 저장돼 있던 캐시 폐기
+CACHE_PATH   = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))  # 빈 값 = 캐시 끔
+CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "64"))
+CACHE_TTL_H  = float(os.getenv("LLM_CACHE_TTL_H", "168"))  # 기본 7일
+
+def _cache_key(system: str, user: str, model: str, temperature: float, fmt: str = "") -> str:
+    raw = json.dumps([SCHEMA_VERSION, model, round(float(temperature), 3), system, user, fmt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _cache_db() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+    con = sqlite3.connect(CACHE_PATH, timeout=5)
+    con.execute("CREATE TABLE IF NOT EXISTS llm_cache("
+                "k TEXT PRIMARY KEY, v TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires REAL NOT NULL, used REAL NOT NULL)")
+    return con
+
+def cache_get(key: str):
+    if not CACHE_PATH: return None
+    try:
+        with closing(_cache_db()) as con, con:
+            row = con.execute("SELECT v, expires FROM llm_cache WHERE k=?", (key,)).fetchone()
+            if not row: return None
+            if row[1] < time.time():
+                con.execute("DELETE FROM llm_cache WHERE k=?", (key,))
+                return None
+            con.execute("UPDATE llm_cache SET used=? WHERE k=?", (time.time(), key))
+            return row[0]
+    except sqlite3.Error:
+        return None  # 캐시 장애는 호출 실패로 번지지 않게
+
+def cache_put(key: str, value: str, ttl_h: float = None):
+    if not CACHE_PATH or not value: return
+    now = time.time()
+    ttl = (CACHE_TTL_H if ttl_h is None else ttl_h) * 3600
+    try:
+        with closing(_cache_db()) as con, con:
+            con.execute("INSERT OR REPLACE INTO llm_cache VALUES(?,?,?,?,?)",
+                        (key, value, len(value.encode("utf-8")), now + ttl, now))
+            con.execute("DELETE FROM llm_cache WHERE expires < ?", (now,))
+            total = con.execute("SELECT COALESCE(SUM(size),0) FROM llm_cache").fetchone()[0]
+            limit = int(CACHE_MAX_MB * 1024 * 1024)
+            if total > limit:
+                drop = []
+                for k, sz in con.execute("SELECT k, size FROM llm_cache WHERE k<>? ORDER BY used", (key,)):
+                    if total <= limit: break
+                    drop.append((k,)); total -= sz
+                con.executemany("DELETE FROM llm_cache WHERE k=?", drop)
+    except sqlite3.Error:
+        pass
+
+def cache_stats() -> dict:
+    if not CACHE_PATH or not os.path.exists(CACHE_PATH): return {"entries": 0, "bytes": 0}
+    try:
+        with closing(_cache_db()) as con:
+            n, b = con.execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM llm_cache").fetchone()
+            return {"entries": n, "bytes": b}
+    except sqlite3.Error:
+        return {"entries": 0, "bytes": 0}
+
+def cache_clear():
+    if not CACHE_PATH or not os.path.exists(CACHE_PATH): return
+    try:
+        with closing(_cache_db()) as con, con:
+            con.execute("DELETE FROM llm_cache")
+    except sqlite3.Error:
+        pass
+
+# ============== 재시도 정책 ==============
+# 생성 1건 전체 시한(deadline) 안에서만 재시도. 오류를 분류해 429/5xx/타임아웃/연결 오류만 재시도하고
+# 400/인증/권한/쿼터 소진은 즉시 포기. 대기는 지수 백오프 + full jitter, 서버가 Retry-After를 주면 그 값.
+# 헤지: 선택 모델 응답이 최근 지연 분포의 hedge_pct 백분위를 넘기면 폴백 모델로 동시 요청, 먼저 온 것 사용.
+@dataclass
+class RetryPolicy:
+    deadline_s: float = float(os.getenv("LLM_DEADLINE_S", "120"))  # gen_* 1건 전체 시한
+    attempts: int = 3                # 모델당 최대 시도
+    base_s: float = 0.7
+    cap_s: float = 8.0
+    call_timeout_s: float = OPENAI_TIMEOUT
+    fallback_model: str = "gpt-4o"   # 빈 값 = 모델 스위치/헤지 없음
+    hedge_pct: float = 0.9           # 0 = 헤지 끔
+    hedge_min_samples: int = 20
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        if retry_after is not None: return max(0.0, retry_after)
+        return random.uniform(0, min(self.cap_s, self.base_s * (2 ** attempt)))
+
+DEFAULT_POLICY = RetryPolicy()
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, (openai.APIConnectionError, httpx.TimeoutException, httpx.TransportError)):
+        return True  # APITimeoutError 포함, 스트림 도중 끊김 포함
+    if isinstance(e, openai.APIStatusError):
+        if getattr(e, "code", None) == "insufficient_quota": return False
+        return e.status_code in (408, 409, 429) or e.status_code >= 500
+    return False
+
+def retry_after_s(e: Exception):
+    hdr = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        if hdr.get("retry-after-ms"): return float(hdr["retry-after-ms"]) / 1000
+        ra = hdr.get("retry-after")
+        if not ra: return None
+        if ra.strip().isdigit(): return float(ra)
+        return max(0.0, (parsedate_to_datetime(ra) - datetime.now(timezone.utc)).total_seconds())
+    except (ValueError, TypeError):
+        return None
+
+# 모델별 최근 성공 지연(초) — 헤지 임계값 계산용
+class _Latency:
+    def __init__(self, keep: int = 200):
+        self._d, self._keep, self._lock = {}, keep, threading.Lock()
+
+    def add(self, model: str, secs: float):
+        with self._lock:
+            self._d.setdefault(model, deque(maxlen=self._keep)).append(secs)
+
+    def pct(self, model: str, q: float, min_n: int):
+        with self._lock:
+            xs = sorted(self._d.get(model) or [])
+        if len(xs) < min_n: return None
+        return xs[min(len(xs)-1, int(q * len(xs)))]
+
+LATENCY = _Latency()
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+# ============== LLM 호출( JSON 강제 + 재시도 + 모델 스위치 ) ==============
+MAX_TOKENS = 1800
+
+def call_json(system: str, user: str, model: str, temperature: float, refresh: bool = False,
+              on_partial=None, *, policy: RetryPolicy = None, deadline: float = None,
+              max_tokens: int = MAX_TOKENS, schema: type = None) -> str:
+    # refresh=True: 캐시 조회는 건너뛰고 새 응답으로 덮어씀
+    # on_partial(JsonStream): 지정 시 stream=True로 받으며 값이 닫힐 때마다(최대 ~5회/초) 호출
+    # deadline: time.monotonic() 기준 절대 시각. gen_* 가 여러 호출에 같은 값을 넘겨 시한을 공유
+    # schema: 응답 pydantic 모델. strict 구조화 출력으로 요청(미지원 모델은 JSON 모드 + 프롬프트 예시로 강등)
+    policy = policy or DEFAULT_POLICY
+    end = deadline or time.monotonic() + policy.deadline_s
+    with telemetry.span("call", model=model, stream=on_partial is not None, max_tokens=max_tokens) as rec:
+        if schema is not None:
+            rec["schema"] = schema.__name__
+            rec["schema_tokens"] = count_tokens(json.dumps(strict_schema(schema), ensure_ascii=False, separators=(",", ":")), model)
+        rec["prompt_est"] = count_tokens(system, model) + count_tokens(user, model) + rec.get("schema_tokens", 0)
+        key = _cache_key(system, user, model, temperature, schema.__name__ if schema else "")
+        if not refresh:
+            hit = cache_get(key)
+            if hit:
+                rec["cache"] = "hit"
+                return hit
+        rec["cache"] = "bypass" if refresh else "miss"
+        rec["tries"] = []
+        out = _request(system, user, model, temperature, on_partial, policy, end, key, rec, max_tokens, schema)
+        rec["attempts"] = len(rec["tries"])
+        rec["json_ok"] = bool(find_json(out))
+        return out
+
+def _cacheable(out: str, schema) -> bool:
+    # 스키마가 있으면 검증 통과한 응답만 저장 — JSON이지만 형태가 틀린 응답이 TTL 동안 폴백을 되풀이하지 않게
+    if not CACHE_PATH: return False
+    if schema is None: return bool(find_json(out))
+    try: schema.model_validate(parse_json(out, {})); return True
+    except ValidationError: return False
+
+def _request(system, user, model, temperature, on_partial, policy, end, key, rec, max_tokens, schema) -> str:
+    # 시도마다 rec["tries"]에 {model, ms, ok|err, 토큰} 기록. 헤지 스레드에서도 같은 rec에 append
+    cli = client()
+    est = estimate_tokens(system) + estimate_tokens(user) + max_tokens
+    stream = on_partial is not None
+
+    def _once(md: str, sent: threading.Event = None, limit: bool = True) -> str:
+        # sent: 실제 전송 직전에 set(헤지 시계 시작점). limit=False: 호출자가 레이트 리밋 대기를 이미 마침
+        if limit and _limiter: _limiter.acquire(est)
+        rf, u = _response_format(schema, md), user
+        if rf["type"] == "json_object" and schema is not None:  # 강등: 형태는 프롬프트 예시로 안내
+            u = f"{user}\n[schema]\n{schema_example(schema)}"
+        t0 = time.monotonic()
+        tr = {"model": md, "format": rf["type"]}
+        rec["tries"].append(tr)
+        try:
+            if sent: sent.set()
+            r = cli.chat.completions.create(
+                model=md,
+                temperature=temperature,
+                max_tokens=max_tokens,           # 과도 토큰 방지
+                timeout=max(1.0, min(policy.call_timeout_s, end - t0)),
+                response_format=rf,              # JSON 강제(가능하면 스키마 strict)
+                messages=[{"role":"system","content":system},
+                          {"role":"user","content":u}],
+                stream=stream,
+                **({"stream_options": {"include_usage": True}} if stream else {}),
+            )
+            usage = None
+            if not stream:
+                out = r.choices[0].message.content.strip()
+                usage, tr["finish"] = r.usage, r.choices[0].finish_reason
+            else:
+                js, last = JsonStream(), 0.0
+                for ch in r:
+                    if ch.usage: usage = ch.usage  # include_usage: 마지막 청크(choices 비어 있음)
+                    if not ch.choices: continue
+                    tr["finish"] = ch.choices[0].finish_reason or tr.get("finish")
+                    d = ch.choices[0].delta.content
+                    if d and js.feed(d) and time.monotonic()-last > 0.2:
+                        last = time.monotonic(); on_partial(js)
+                out = js.buf.strip()
+            if usage:
+                tr["prompt_tokens"], tr["completion_tokens"] = usage.prompt_tokens, usage.completion_tokens
+            tr["ok"] = True
+        except Exception as e:
+            tr["err"] = getattr(e, "status_code", None) or type(e).__name__
+            raise
+        finally:
+            tr["ms"] = round((time.monotonic() - t0) * 1000, 1)
+        LATENCY.add(md, time.monotonic() - t0)
+        if _cacheable(out, schema): cache_put(key, out)
+        return out
+
+    def _hedged(md: str):
+        # 스트리밍은 미리보기가 섞이므로 헤지하지 않음
+        fb = policy.fallback_model
+        thr = (LATENCY.pct(md, policy.hedge_pct, policy.hedge_min_samples)
+               if policy.hedge_pct and fb and fb != md and not stream else None)
+        if thr is None: return _once(md), md
+        # 레이트 리밋 대기·풀 대기열 시간은 헤지 시계에 넣지 않음 → 리밋에 걸린 호출마다 폴백 모델로 이중 요청하지 않게
+        if _limiter: _limiter.acquire(est)
+        sent = threading.Event()
+        first = _hedge_pool.submit(_once, md, sent, False)
+        while not sent.wait(0.05) and not first.done() and time.monotonic() < end: pass
+        try:
+            return first.result(timeout=thr), md
+        except FutureTimeout:
+            pass
+        rec["hedged"] = True
+        futs = {first: md, _hedge_pool.submit(_once, fb): fb}  # 헤지 요청은 자기 스레드에서 리밋 대기(예산 공유)
+        pending, err = set(futs), None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done: raise TimeoutError("deadline")
+            for f in done:
+                if f.exception() is None: return f.result(), futs[f]
+                err = err or f.exception()
+        raise err
+
+    def _done(out: str, md: str) -> str:
+        rec["answered_by"] = md
+        rec["model_switch"] = md != model
+        for k in ("prompt_tokens", "completion_tokens"):
+            rec[k] = sum(t.get(k) or 0 for t in list(rec["tries"]))
+        return out
+
+    # 선택 모델 → 폴백 모델 순. 시한이 남아 있는 동안만
+    for md in dict.fromkeys([model, policy.fallback_model or model]):
+        for i in range(policy.attempts):
+            if end - time.monotonic() < 1.0:
+                rec["gave_up"] = "deadline"; return ""
+            try:
+                return _done(*_hedged(md))
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if status == 400 and schema is not None and _strict_rejected(e, md):
+                    continue  # 이 모델은 이후 JSON 모드로(시도 횟수는 소모)
+                if status is not None and not is_retryable(e):
+                    if status == 404: break  # 모델 없음 → 폴백 모델로
+                    rec["gave_up"] = status; return ""  # 400/401/403/쿼터: 즉시 포기
+                if i < policy.attempts-1:
+                    time.sleep(min(policy.backoff(i, retry_after_s(e)), max(0.0, end - time.monotonic())))
+    rec["gave_up"] = "exhausted"
+    return ""  # 최종 실패시 빈 문자열
+
+# ============== 타깃/이미지 ==============
+def detect_demo(topic: str):
+    t=(topic or "").lower()
+    age="성인"
+    for pat,label in [(r"(유아|영유아|신생아)","유아"),(r"(아동|초등|키즈)","아동"),
+                      (r"(청소년|10대)","청소년"),(r"20대","20대"),(r"30대","30대"),
+                      (r"40대","40대"),(r"50대|장년|중년","50대"),(r"60대|시니어","60대"),
+                      (r"70대|고령","70대")]:
+        if re.search(pat,t): age=label; break
+    if re.search(r"(남성|남자|아빠|형|삼촌|남편)", t): gender="남성"
+    elif re.search(r"(여성|여자|엄마|언니|이모|아내)", t): gender="여성"
+    else: gender="혼합"
+    return age, gender
+
+def img_en(base_en, age, gender, place, mood, shot, style):
+    age_map={"유아":"toddlers","아동":"children","청소년":"teenagers","20대":"people in their 20s",
+             "30대":"people in their 30s","40대":"people in their 40s","50대":"people in their 50s",
+             "60대":"people in their 60s","70대":"people in their 70s","성인":"adults"}
+    gender_map={"남성":"Korean man","여성":"Korean woman","혼합":"Korean men and women"}
+    place_map={"한국 가정 거실":"modern Korean home living room interior",
+               "한국 아파트 단지":"Korean apartment complex outdoor area",
+               "한국 동네 공원":"local Korean neighborhood park",
+               "한국 병원/검진센터":"Korean medical clinic interior",
+               "한국형 주방/식탁":"modern Korean kitchen and dining table"}
+    shot_map={"클로즈업":"close-up","상반신":"medium shot","전신":"full body shot","탑뷰/테이블샷":"top view table shot"}
+    mood_map={"따뜻한":"warm","밝은":"bright","차분한":"calm","활기찬":"energetic"}
+    style_map={"사진 실사":"realistic photography, high resolution","시네마틱":"cinematic photo style",
+               "잡지 화보":"editorial magazine style","자연광":"natural lighting"}
+    return (f"{gender_map.get(gender,'Korean men and women')} {age_map.get(age,'adults')} at a "
+            f"{place_map.get(place,'modern Korean interior')}, {shot_map.get(shot,'medium shot')}, "
+            f"{mood_map.get(mood,'warm')} mood, {style_map.get(style,'realistic photography, high resolution')}. "
+            f"Context: {base_en}. natural lighting, high contrast, no text overlay, no captions, no watermarks, no logos.")
+
+def classify_mode(topic: str) -> str:
+    return "sales" if any(k in (topic or "") for k in ["시공","교체","설치","수리","누수","보수","후기","현장","관악","강쌤철물"]) else "info"
+
+# ============== 스키마/폴백 ==============
+# 타깃별 최소 스키마. 유튜브 호출엔 유튜브만, 블로그 호출엔 블로그만 보냄(반대쪽 입력 토큰·생성 유도 제거).
+# strict 구조화 출력(response_format=json_schema)으로 요청하고 pydantic으로 검증 → 형태가 틀린 JSON은 파싱 실패로 처리.
+STRICT_OUTPUT = os.getenv("LLM_STRICT_OUTPUT", "1") != "0"  # 0 = 예전처럼 JSON 모드 + 프롬프트 예시
+_no_strict = set()  # strict 스키마를 400으로 거절한 모델(이후 JSON 모드)
+
+class _Out(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+class EnPrompt(_Out):
+    en: str = Field(description="(EN no text)")
+
+class ChapterImage(_Out):
+    index: int
+    en: str = Field(description="(EN no text)")
+
+class YoutubeImages(_Out):
+    thumbnail: EnPrompt
+    chapters: list[ChapterImage]
+
+class Chapter(_Out):
+    title: str
+    script: str
+
+class YouTube(_Out):
+    titles: list[str]
+    description: str
+    chapters: list[Chapter]
+    images: YoutubeImages
+    hashtags: list[str] = Field(description="#..")
+
+class YoutubeOut(_Out):
+    youtube: YouTube
+
+class BlogImage(_Out):
+    label: str = Field(description="대표|본문1|본문2…")
+    en: str = Field(description="(EN no text)")
+
+class Blog(_Out):
+    titles: list[str]
+    body: str = Field(description="마크다운 본문(구조는 system 지시). 본문 내 [이미지:대표/본문1/본문2] 포함")
+    images: list[BlogImage]
+    tags: list[str] = Field(description="#..")
+
+class BlogOut(_Out):
+    blog: Blog
+
+# 분할 생성 조각
+class ChapterHead(_Out):
+    title: str
+
+class YoutubeOutline(_Out):
+    titles: list[str]
+    description: str
+    chapters: list[ChapterHead]
+    images: YoutubeImages
+    hashtags: list[str] = Field(description="#..")
+
+class BlogOutline(_Out):
+    titles: list[str]
+    points: list[str] = Field(description="핵심 5가지 소제목")
+    images: list[BlogImage]
+    tags: list[str] = Field(description="#..")
+
+class ChapterPart(_Out):
+    script: str
+
+class SectionPart(_Out):
+    text: str = Field(description="섹션 본문(마크다운, 제목 줄 없이)")
+
+@lru_cache(maxsize=None)
+def strict_schema(cls) -> dict:
+    # pydantic JSON Schema → OpenAI strict 형식: $ref 인라인, 모든 키 required, additionalProperties=false
+    s = cls.model_json_schema()
+    defs = s.pop("$defs", {})
+    def fix(n):
+        if "$ref" in n: n = defs[n["$ref"].rsplit("/", 1)[-1]]
+        out = {k: v for k, v in n.items() if k not in ("title", "default")}
+        if "properties" in out:
+            out["properties"] = {k: fix(v) for k, v in out["properties"].items()}
+            out["required"], out["additionalProperties"] = list(out["properties"]), False
+        if "items" in out: out["items"] = fix(out["items"])
+        return out
+    return fix(s)
+
+@lru_cache(maxsize=None)
+def schema_example(cls) -> str:
+    # JSON 모드(비 strict)용 프롬프트 예시: {"titles":["..."],"images":{"thumbnail":{"en":"(EN no text)"}}, …}
+    def ex(n):
+        if "properties" in n: return {k: ex(v) for k, v in n["properties"].items()}
+        if n.get("type") == "array": return [ex({**n["items"], **{k: n[k] for k in ("description",) if k in n}})]
+        if n.get("type") == "integer": return 1
+        return n.get("description", "...")
+    return json.dumps(ex(strict_schema(cls)), ensure_ascii=False)
+
+def _response_format(schema, model: str) -> dict:
+    if schema is None or not STRICT_OUTPUT or model in _no_strict: return {"type": "json_object"}
+    return {"type": "json_schema",
+            "json_schema": {"name": schema.__name__, "strict": True, "schema": strict_schema(schema)}}
+
+def _strict_rejected(e: Exception, model: str) -> bool:
+    # json_schema 미지원 모델의 400 → 기록해 두고 같은 호출을 JSON 모드로 다시
+    msg = str(e).lower()
+    if model in _no_strict or not ("response_format" in msg or "json_schema" in msg): return False
+    _no_strict.add(model)
+    return True
+
+def validate(cls, raw: str) -> dict:
+    # 응답 → 스키마 검증된 dict. JSON 아님/형태 불일치 = {}
+    try: return cls.model_validate(parse_json(raw, {})).model_dump()
+    except ValidationError: return {}
+
+def fb_youtube(topic:str, n:int):
+    ch=[{"title":f"{topic} 핵심 포인트 {i+1}",
+         "script":f"{topic} 관련 핵심 포인트 {i+1}을(를) 현장 기준으로 간단히 설명합니다."} for i in range(n)]
+    return {"titles":[f"{topic} 가이드 {i+1}" for i in range(10)],
+            "description":f"{topic} 요약 가이드입니다.",
+            "chapters":ch,
+            "images":{"thumbnail":{"en":"Korean home thumbnail, no text overlay"},
+                      "chapters":[{"index":i+1,"en":"support visual, no text overlay"} for i in range(n)]},
+            "hashtags":["#집수리","#현장팁","#강쌤철물"]*5}
+
+def fb_blog(topic:str, img_n:int, mode:str):
+    body=(f"## {topic}\n\n네트워크 지연 시 제공되는 안전본입니다.\n\n"
+          "### 핵심 5가지\n1) 현장 진단\n2) 원인 추정\n3) 준비물 체크\n4) 순서대로 작업\n5) 마무리 점검\n\n"
+          "### 체크리스트(6~8)\n- 누수/결선/고정\n- 소음/진동\n- 경고등/오류코드\n- 마감\n- 재방문 필요성\n- 사진 기록\n\n"
+          "### 자가진단(5)\n- 증상 지속 여부\n- 특정 조건만 발생?\n- 최근 교체/수리 이력\n- 임시조치 효과\n- A/S 대상 여부\n\n"
+          "### FAQ(3)\n- 시간: 1~3시간\n- 비용: 난이도/부품 의존\n- 준비: 공간확보·전원/밸브 차단\n\n"
+          "[이미지:대표]\n[이미지:본문1]\n[이미지:본문2]\n")
+    if mode=="sales": body += f"\n{CTA}"
+    imgs=[{"label":"대표","en":"Korean home context, no text overlay"}]+[
+        {"label":f"본문{i}","en":f"support visual for section {i} of '{topic}' (no text overlay)"} for i in range(1,img_n)
+    ]
+    return {"titles":[f"{topic} 블로그 {i+1}" for i in range(10)],
+            "body":body,"images":imgs[:img_n],
+            "tags":["#집수리","#시공후기","#관악구","#강쌤철물"]}
+
+# ============== 생성 ==============
+SYS_YT=(
+  "[voice] 20년 차 현장 전문가 '강쌤'. 차분·존대, 가벼운 유머. 2~3문장마다 호흡.\n"
+  "사례/비교/주의/대안 포함. 마무리 2줄 요약+체크 3~5.\n"
+  "한국 맥락. 반드시 JSON만 반환."
+)
+def _sys_blog(min_chars):
+    return ("[voice] 20년 차 현장 전문가 '강쌤'. 차분·존대. 현장 디테일 1~2개.\n"
+            f"길이>={min_chars}자. 구조: 서론→핵심5→체크리스트(6~8)→자가진단(5)→FAQ(3)→마무리. JSON만.")
+
+def _head(topic,tone,mode,age,gender) -> str:
+    return (f"[topic]{topic}\n[tone]{tone}\n[mode]{'info' if mode=='info' else 'sales'}\n"
+            f"[demo] age={age}, gender={gender}\n")
+
+def _finish_youtube(yt,topic,n,mode,rec):
+    if not yt.get("titles"): yt["titles"]=[f"{topic} 가이드 {i+1}" for i in range(10)]
+    if (not yt.get("description")) or (not yt.get("chapters")):
+        rec["fallback"]=True; yt=fb_youtube(topic,n)
+    # CTA
+    if mode=="sales":
+        desc=(yt.get("description","") or "").rstrip()
+        if CTA not in desc: yt["description"]=(desc+f"\n{CTA}").strip()
+    # 이미지 기본
+    if "images" not in yt:
+        yt["images"]={"thumbnail":{"en":"Korean home thumbnail, no text overlay"},
+                      "chapters":[{"index":i+1,"en":"support visual, no text overlay"} for i in range(n)]}
+    return yt
+
+def _finish_blog(blog,topic,mode,img_n,rec):
+    if (not blog.get("body")) or (len(blog.get("body",""))<500):
+        rec["fallback"]=True; blog=fb_blog(topic,img_n,mode)
+    if mode=="sales" and CTA not in blog.get("body",""):
+        blog["body"]=(blog.get("body","").rstrip()+f"\n\n{CTA}")
+    # 이미지 개수 맞추기
+    imgs=(blog.get("images") or [])[:img_n]
+    while len(imgs)<img_n:
+        i=len(imgs)
+        imgs.append({"label":"대표" if i==0 else f"본문{i}",
+                     "en":f"support visual for section {i} of '{topic}' (no text overlay)"})
+    blog["images"]=imgs
+    if not blog.get("titles"): blog["titles"]=[f"{topic} 블로그 {i+1}" for i in range(10)]
+    if not blog.get("tags"): blog["tags"]=["#집수리","#시공후기","#관악구","#강쌤철물"]
+    return blog
+
+@contextmanager
+def _report_to(rec, report):
+    # report(dict)를 넘긴 호출자에게 gen 기록(fallback · fallback_parts · model_switch · salvaged …)을 돌려줌
+    # 배치처럼 폴백 문구가 섞인 결과를 완료로 치면 안 되는 곳에서 확인
+    try: yield
+    finally:
+        if report is not None: report.update(rec)
+
+def gen_youtube(topic,tone,n,mode,model,on_partial=None,*,age="성인",gender="혼합",temperature=0.6,refresh=False,
+                policy=None,fanout=False,report=None):
+    with telemetry.span("gen", target="youtube", topic=topic, model=model, fanout=fanout) as rec, _report_to(rec,report):
+        policy=policy or DEFAULT_POLICY
+        end=time.monotonic()+policy.deadline_s  # 모든 호출이 시한 공유
+        if fanout:
+            cx=_cx(SYS_YT,_head(topic,tone,mode,age,gender),model,min(temperature,0.6),refresh,policy,end)
+            yt=_youtube_fanout(cx,topic,n,on_partial,rec)
+            return _finish_youtube(yt,topic,n,mode,rec)
+        user=f"{_head(topic,tone,mode,age,gender)}[N]{n}"
+        # 스트리밍: 닫힌 필드만 미리보기로 전달
+        cb=(lambda js: on_partial(js.snapshot().get("youtube") or {})) if on_partial else None
+        cx=_cx(SYS_YT,_head(topic,tone,mode,age,gender),model,min(temperature,0.6),refresh,policy,end)
+        raw=call_json(SYS_YT,user,model,cx["temp"],refresh,cb,policy=policy,deadline=end,schema=YoutubeOut)
+        data=validate(YoutubeOut,raw)
+        if not data.get("youtube"):
+            rec["parse_fail"]=1
+            yt=_salvage_youtube(cx,raw,topic,n,rec)  # 잘린 응답 → 살린 부분 + 빠진 필드만 작은 호출로
+            if yt: return _finish_youtube(yt,topic,n,mode,rec)
+        # 형식 불량 → 모델 스위치 재시도(남은 시한 내). 빈 응답 = call_json이 폴백 모델까지 써서 포기(소진·시한·4xx) → 다시 안 부름
+        if raw and not data.get("youtube") and policy.fallback_model:
+            rec["model_switch"]=True
+            data=validate(YoutubeOut,call_json(SYS_YT,user,policy.fallback_model,0.6,refresh,cb,policy=policy,deadline=end,
+                                               schema=YoutubeOut))
+            if not data.get("youtube"): rec["parse_fail"]+=1
+        return _finish_youtube(data.get("youtube") or {},topic,n,mode,rec)
+
+def gen_blog(topic,tone,mode,min_chars,img_n,model,on_partial=None,*,age="성인",gender="혼합",temperature=0.6,refresh=False,
+             policy=None,fanout=False,report=None):
+    with telemetry.span("gen", target="blog", topic=topic, model=model, fanout=fanout) as rec, _report_to(rec,report):
+        policy=policy or DEFAULT_POLICY
+        end=time.monotonic()+policy.deadline_s  # 모든 호출이 시한 공유
+        if fanout:
+            cx=_cx(_sys_blog(min_chars),_head(topic,tone,mode,age,gender),model,min(temperature,0.6),refresh,policy,end,
+                   min_chars=min_chars)
+            blog=_blog_fanout(cx,topic,mode,img_n,on_partial,rec)
+            return _finish_blog(blog,topic,mode,img_n,rec)
+        sys=_sys_blog(min_chars)
+        user=_head(topic,tone,mode,age,gender).rstrip()
+        # 스트리밍: 본문은 한 문자열이라 작성 중인 값까지 받아 미리보기에서 섹션 단위로 자름
+        cb=(lambda js: on_partial(js.snapshot(partial=True).get("blog") or {})) if on_partial else None
+        cx=_cx(sys,_head(topic,tone,mode,age,gender),model,min(temperature,0.6),refresh,policy,end,min_chars=min_chars)
+        raw=call_json(sys,user,model,cx["temp"],refresh,cb,policy=policy,deadline=end,schema=BlogOut)
+        data=validate(BlogOut,raw)
+        if not data.get("blog"):
+            rec["parse_fail"]=1
+            blog=_salvage_blog(cx,raw,topic,mode,img_n,rec)  # 잘린 응답 → 살린 섹션 + 빠진 섹션만 병렬로
+            if blog: return _finish_blog(blog,topic,mode,img_n,rec)
+        # 형식 불량 → 모델 스위치 재시도(남은 시한 내). 빈 응답 = call_json이 폴백 모델까지 써서 포기(소진·시한·4xx) → 다시 안 부름
+        if raw and not data.get("blog") and policy.fallback_model:
+            rec["model_switch"]=True
+            data=validate(BlogOut,call_json(sys,user,policy.fallback_model,0.6,refresh,cb,policy=policy,deadline=end,
+                                            schema=BlogOut))
+            if not data.get("blog"): rec["parse_fail"]+=1
+        return _finish_blog(data.get("blog") or {},topic,mode,img_n,rec)
+
+# ============== 분할 생성(아웃라인 → 병렬) ==============
+# 한 번에 전부 받으면 MAX_TOKENS(1800)에 걸려 잘리고 → 폴백/재호출로 이어진다.
+# 짧은 아웃라인 호출 1번(제목·챕터/섹션 소제목·태그·이미지) 뒤, 챕터 스크립트와 블로그 섹션을
+# 각각 작은 호출로 동시에 받아 순서대로 조립한다. 조각 하나가 실패하면 그 조각만 폴백 문구로 채움.
+OUTLINE_TOKENS = 900
+BLOG_SECTIONS=[  # (제목, 작성 지침, 분량 비율). 서론은 제목 줄 없이 본문 맨 앞
+    ("서론",           "문제 상황과 독자 공감, 이 글에서 얻을 것. 문단 2~3개", .15),
+    ("핵심 5가지",     "아웃라인의 핵심 5개를 1)~5) 번호로, 항목마다 2~4문장 + 현장 디테일", .35),
+    ("체크리스트(6~8)", "'- ' 목록 6~8개, 항목마다 한 줄 설명", .14),
+    ("자가진단(5)",    "'- ' 예/아니오로 답할 질문 5개", .10),
+    ("FAQ(3)",        "Q. / A. 형식 3쌍", .16),
+    ("마무리",         "2~3문장 요약과 다음 행동 권유", .10),
+]
+_fan_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-fanout")
+
+def _fan_out(fn, args_list, on_done=None) -> list:
+    # 순서 보존 병렬 실행. 텔레메트리 부모 span이 이어지도록 컨텍스트 복사. 실패한 조각은 None
+    futs={_fan_pool.submit(contextvars.copy_context().run, fn, *a): i for i,a in enumerate(args_list)}
+    out=[None]*len(args_list)
+    for f in as_completed(futs):
+        i=futs[f]
+        try: out[i]=f.result()
+        except Exception: out[i]=None
+        if on_done: on_done(i,out[i])
+    return out
+
+def _cx(sys,head,model,temp,refresh,policy,end,**kw) -> dict:
+    # 조각 호출 공통 인자 묶음(분할 생성·부분 복구·부분 재생성 공용)
+    return dict(sys=sys,head=head,model=model,temp=temp,refresh=refresh,policy=policy,end=end,**kw)
+
+def _raw(cx,cls,user,max_tokens=MAX_TOKENS,model=None) -> str:
+    return call_json(cx["sys"],user,model or cx["model"],cx["temp"],cx["refresh"],policy=cx["policy"],
+                     deadline=cx["end"],max_tokens=max_tokens,schema=cls)
+
+def _ask(cx,cls,user,max_tokens=MAX_TOKENS,model=None) -> dict:
+    return validate(cls,_raw(cx,cls,user,max_tokens,model))
+
+def _outline(cx,cls,user,rec) -> dict:
+    # 아웃라인은 뒤 호출 전부의 뼈대라 형식 불량이면 모델 스위치로 한 번 더(단일 호출 경로와 같은 규칙)
+    # 빈 응답(호출 포기)이면 다시 부르지 않고 rec["outline_gave_up"] 표시 → 호출자는 조각 호출 없이 폴백
+    raw=_raw(cx,cls,user,OUTLINE_TOKENS)
+    ol=validate(cls,raw)
+    if not ol:
+        rec["parse_fail"]=rec.get("parse_fail",0)+1
+        if raw and cx["policy"].fallback_model:
+            rec["model_switch"]=True
+            raw=_raw(cx,cls,user,OUTLINE_TOKENS,cx["policy"].fallback_model)
+            ol=validate(cls,raw)
+            if not ol: rec["parse_fail"]+=1
+        if not raw: rec["outline_gave_up"]=True
+    return ol
+
+def _chapter_script(cx,i,heads,extra="") -> str:
+    n=len(heads)
+    outline="\n".join(f"{k+1}. {h}" for k,h in enumerate(heads))
+    last=" 마지막 챕터: 끝에 2줄 요약 + 체크 3~5개." if i==n-1 else ""
+    u=(f"[part]chapter\n{cx['head']}[outline]\n{outline}\n"
+       f"[chapter]{i+1}/{n}: {heads[i]}\n[chars]450~700\n"
+       f"{extra}규칙: 이 챕터의 자막 스크립트만. 다른 챕터 내용 반복 금지.{last}")
+    return _ask(cx,ChapterPart,u,1000).get("script")
+
+def _section_text(cx,i,title,points=(),extra="") -> str:
+    # i: BLOG_SECTIONS 번호 또는 (제목, 지침, 분량 비율) — 목록 밖 소제목 재생성용
+    h,guide,share=BLOG_SECTIONS[i] if isinstance(i,int) else i
+    chars=max(150,int(cx["min_chars"]*share))
+    outline=" → ".join(k if k!="핵심 5가지" or not points else f"{k}({', '.join(points)})" for k,_,_ in BLOG_SECTIONS)
+    u=(f"[part]section\n{cx['head']}[title]{title}\n[outline]{outline}\n"
+       f"[section]{h} — {guide}\n[chars]{chars}자 이상\n{extra}"
+       "규칙: 이 섹션 본문만 마크다운으로(섹션 제목 줄은 쓰지 말 것). 다른 섹션 내용 반복 금지.")
+    return _ask(cx,SectionPart,u,min(MAX_TOKENS,int(chars*1.3)+200)).get("text")
+
+def _youtube_fanout(cx,topic,n,on_partial,rec):
+    user=(f"[part]outline\n{cx['head']}[N]{n}\n"
+          f"규칙: titles 10개, chapters 정확히 {n}개(title만, script 금지), images.chapters {n}개, hashtags 20개.")
+    ol=_outline(cx,YoutubeOutline,user,rec)
+    if not ol: return {}  # 설명이 없으면 _finish_youtube가 어차피 통째로 폴백 → 챕터 호출은 낭비
+    fb=fb_youtube(topic,n)
+    heads=[(c.get("title") if isinstance(c,dict) else "") or fb["chapters"][i]["title"]
+           for i,c in enumerate((ol.get("chapters") or [])[:n])]
+    heads+=[fb["chapters"][i]["title"] for i in range(len(heads),n)]
+    yt={"titles":ol.get("titles") or [],"description":ol.get("description") or "",
+        "chapters":[{"title":h} for h in heads],"hashtags":ol.get("hashtags") or []}
+    if isinstance(ol.get("images"),dict): yt["images"]=ol["images"]
+    if on_partial: on_partial(dict(yt))
+
+    def done(i,script):
+        if not script:
+            rec["fallback_parts"]=rec.get("fallback_parts",0)+1
+            script=fb["chapters"][i]["script"]
+        yt["chapters"][i]["script"]=script
+        if on_partial: on_partial({**yt,"chapters":[dict(c) for c in yt["chapters"]]})
+    _fan_out(_chapter_script,[(cx,i,heads) for i in range(n)],done)
+    return yt
+
+def _blog_fanout(cx,topic,mode,img_n,on_partial,rec):
+    user=(f"[part]outline\n{cx['head']}"
+          f"규칙: titles 10개, points = '핵심 5가지' 소제목 정확히 5개, images {img_n}개(대표, 본문1, 본문2…), tags 20개.")
+    ol=_outline(cx,BlogOutline,user,rec)
+    if rec.get("outline_gave_up"): return {}  # 장애로 아웃라인 호출 포기 → 섹션 6개 호출 없이 폴백
+    # 형식 불량 아웃라인이면 소제목 없이도 섹션은 쓸 수 있음(제목·태그·이미지는 _finish_blog 기본값)
+    points=[str(p) for p in (ol.get("points") or [])][:5]
+    title=(ol.get("titles") or [topic])[0]
+    blog={"titles":ol.get("titles") or [],"images":ol.get("images") or [],"tags":ol.get("tags") or []}
+    texts=[None]*len(BLOG_SECTIONS)
+    if on_partial: on_partial(dict(blog))
+
+    def done(i,text):
+        if not text: rec["fallback_parts"]=rec.get("fallback_parts",0)+1
+        texts[i]=text or ""
+        if on_partial:  # 앞에서부터 연속으로 끝난 섹션 + 다음 섹션 제목(작성 중)
+            k=next((j for j,t in enumerate(texts) if t is None),len(texts))
+            body=assemble_blog_body(topic,texts[:k],mode)
+            if k<len(texts): body+=f"\n\n### {BLOG_SECTIONS[k][0]}\n"
+            on_partial({**blog,"body":body})
+    _fan_out(_section_text,[(cx,i,title,points) for i in range(len(BLOG_SECTIONS))],done)
+    if not any(texts): return blog  # 전부 실패 → _finish_blog가 폴백
+    for i,t in enumerate(texts):  # 빈 섹션은 폴백 본문의 같은 섹션으로
+        if not t: texts[i]=_fb_section(topic,img_n,mode,i)
+    blog["body"]=assemble_blog_body(topic,texts,mode)
+    return blog
+
+def _fb_section(topic,img_n,mode,i) -> str:
+    return split_sections(fb_blog(topic,img_n,mode)["body"]).get(BLOG_SECTIONS[i][0]) or "위 체크리스트부터 차근차근 점검해 보세요."
+
+# 이미지 앵커는 서론 뒤(대표), 핵심 5가지 뒤(본문1), 체크리스트 뒤(본문2)
+_ANCHORS={0:"[이미지:대표]",1:"[이미지:본문1]",2:"[이미지:본문2]"}
+
+def assemble_blog_body(topic,texts,mode=None) -> str:
+    parts=[f"## {topic}"]
+    for i,t in enumerate(texts):
+        h=BLOG_SECTIONS[i][0]
+        parts.append(t.strip() if i==0 else f"### {h}\n{t.strip()}")
+        if i in _ANCHORS: parts.append(_ANCHORS[i])
+    return "\n\n".join(parts)+"\n"
+
+def _norm_head(h: str) -> str:
+    return re.sub(r"\(.*?\)","",h).replace(" ","")  # "체크리스트(6~8)" == "체크리스트"
+
+# 모델이 소제목을 그대로 쓰지 않는 경우가 많아("핵심 포인트 5가지", "자주 묻는 질문(FAQ)") 키워드로 맞춤. 앞 섹션 우선
+_HEAD_KEYS={1:("핵심",),2:("체크리스트","체크"),3:("자가진단","셀프진단","자가점검"),
+            4:("FAQ","자주묻는","Q&A","질문"),5:("마무리","결론","정리")}
+
+def _section_index(head: str):
+    h=_norm_head(head or "")
+    if h==_norm_head(BLOG_SECTIONS[0][0]): return 0
+    return next((i for i,keys in _HEAD_KEYS.items() if any(k.lower() in h.lower() for k in keys)),None)
+
+def insert_section(body: str, i: int, text: str) -> str:
+    # BLOG_SECTIONS[i] 섹션(+ 이미지 앵커)을 제자리에 — 뒤 순서 섹션 제목 앞, 없으면 끝
+    block=f"### {BLOG_SECTIONS[i][0]}\n{text.strip()}"
+    if i in _ANCHORS and _ANCHORS[i] not in body: block+=f"\n\n{_ANCHORS[i]}"
+    nxt=next((m for m in re.finditer(r"^###\s+(.+?)\s*$",body,re.M) if (_section_index(m.group(1)) or 0)>i),None)
+    if not nxt: return body.rstrip()+f"\n\n{block}\n"
+    return body[:nxt.start()]+block+"\n\n"+body[nxt.start():]
+
+def split_sections(body) -> dict:
+    # "### 제목" 기준으로 나눔. 첫 ### 전(## 제목 줄 제외)은 "서론". 키는 BLOG_SECTIONS 제목으로 맞춤
+    out,cur,buf={},"서론",[]
+    for line in (body or "").split("\n"):
+        m=re.match(r"^###\s+(.+?)\s*$",line)
+        if m: out[cur]="\n".join(buf).strip(); cur,buf=m.group(1),[]
+        elif not line.startswith(("## ","[이미지:")): buf.append(line)  # 이미지 앵커는 조립 때 다시 붙임
+    out[cur]="\n".join(buf).strip()
+    canon=lambda k: k if _section_index(k) is None else BLOG_SECTIONS[_section_index(k)][0]
+    return {canon(k):v for k,v in out.items()}
+
+# ============== 부분 복구(잘린 응답 살리기) ==============
+# max_tokens에 걸려 잘리거나 살짝 깨진 응답을 통째로 버리지 않는다. 닫힌 값은 전부 살리고
+# 스키마 기준으로 빠진 필드(뒤쪽 챕터, FAQ 등 뒤 섹션, images/tags)만 작은 호출로 다시 받아 끼운다.
+# 살린 게 너무 적으면(설명·첫 챕터/첫 섹션도 없음) {} → 호출자가 예전처럼 모델 스위치 전체 재호출.
+def salvage_json(s: str, partial: bool = False) -> dict:
+    # 끝 쉼표 제거로 되면 그대로, 아니면 열린 문자열/배열/객체를 닫아 마지막으로 닫힌 값까지
+    # partial=True: 쓰이다 만 마지막 문자열 값도 포함
+    if not isinstance(s, str): return {}
+    v = parse_json(s, {}) or parse_json(re.sub(r",\s*(?=[}\]])", "", s), {})
+    if v: return v
+    js = JsonStream(); js.feed(s)
+    return js.snapshot(partial=partial)
+
+def missing_fields(cls, data) -> list:
+    # 스키마에 비해 빠졌거나 형태가 틀린 필드 경로("chapters.3.script", "images" …)
+    try:
+        cls.model_validate(data); return []
+    except ValidationError as e:
+        return list(dict.fromkeys(".".join(str(p) for p in err["loc"]) for err in e.errors()))
+
+@lru_cache(maxsize=None)
+def _subset(cls, names: tuple):
+    # cls의 일부 필드만 가진 응답 모델(빠진 필드만 다시 받을 때)
+    return create_model(f"{cls.__name__}Fix", __base__=_Out,
+                        **{k: (cls.model_fields[k].annotation, cls.model_fields[k]) for k in names})
+
+def _salvage_youtube(cx,raw,topic,n,rec) -> dict:
+    yt=salvage_json(raw).get("youtube")
+    if not isinstance(yt,dict): return {}
+    chs=[c for c in (yt.get("chapters") or []) if isinstance(c,dict) and c.get("title") and c.get("script")][:n]
+    if not (yt.get("description") and chs): return {}
+    yt["chapters"]=chs
+    need=list(dict.fromkeys(p.split(".")[0] for p in missing_fields(YouTube,yt)))
+    if len(chs)<n: need.append("chapters")
+    rec["salvaged"]=True
+    rec["missing"]=[k if k!="chapters" else f"chapters[{len(chs)+1}-{n}]" for k in need]
+    if not need: return yt
+    have="\n".join(f"{i+1}. {c['title']}" for i,c in enumerate(chs))
+    u=(f"[part]repair\n{cx['head']}[N]{n}\n[have] 완성된 챕터:\n{have}\n[missing]{', '.join(need)}\n"
+       f"규칙: 빠진 필드만. chapters는 {len(chs)+1}~{n}번 {n-len(chs)}개만(앞 챕터 반복 금지), "
+       f"images는 썸네일 + 챕터 {n}개, titles 10개, hashtags 20개.")
+    fix=_ask(cx,_subset(YouTube,tuple(need)),u)
+    for k in need:
+        if k=="chapters": yt["chapters"]=chs+(fix.get("chapters") or [])[:n-len(chs)]
+        elif fix.get(k): yt[k]=fix[k]
+    rec["repaired"]=[k for k in need if fix.get(k)]
+    # 복구 호출이 실패/덜 채움 → 모자란 챕터·빈 제목/해시태그는 폴백 문구로(조각 수만큼 fallback_parts)
+    fb=fb_youtube(topic,n)
+    for i in range(len(yt["chapters"]),n):
+        yt["chapters"].append(fb["chapters"][i])
+        rec["fallback_parts"]=rec.get("fallback_parts",0)+1
+    for k in ("titles","hashtags"):
+        if not yt.get(k):
+            yt[k]=fb[k]; rec["fallback_parts"]=rec.get("fallback_parts",0)+1
+    return yt
+
+def _salvage_blog(cx,raw,topic,mode,img_n,rec) -> dict:
+    blog=salvage_json(raw).get("blog")
+    if not isinstance(blog,dict): return {}
+    body,todo=blog.get("body"),[]
+    if not isinstance(body,str):  # 본문 도중 잘림 → 작성 중이던 섹션 앞까지만 살리고 뒤 섹션은 다시 받음
+        body=(salvage_json(raw,partial=True).get("blog") or {}).get("body") or ""
+        heads=[m for m in re.finditer(r"^###\s+(.+?)\s*$",body,re.M) if _section_index(m.group(1)) is not None]
+        body=body[:heads[-1].start()].rstrip() if heads else ""
+        secs=split_sections(body)
+        todo=[i for i,(h,_,_) in enumerate(BLOG_SECTIONS) if i and not secs.get(h)]  # 서론은 제목 줄이 없어 못 끼움
+    # 본문이 닫혔으면(뒤쪽 images/tags에서 잘림) 본문은 그대로 두고 메타만 다시 받음
+    if not split_sections(body).get("서론"): return {}  # 서론도 못 끝냄 → 전체 재호출이 나음
+    blog["body"]=body
+    meta=list(dict.fromkeys(p.split(".")[0] for p in missing_fields(Blog,blog)))
+    rec["salvaged"]=True
+    rec["missing"]=[BLOG_SECTIONS[i][0] for i in todo]+meta
+    if not (todo or meta): return blog
+    title=(blog.get("titles") or [topic])[0]
+    u=(f"[part]repair\n{cx['head']}[title]{title}\n[missing]{', '.join(meta)}\n"
+       f"규칙: 빠진 필드만. images {img_n}개(대표, 본문1, 본문2…), titles 10개, tags 20개.")
+    jobs=[(_section_text,(cx,i,title)) for i in todo]+([(_ask,(cx,_subset(Blog,tuple(meta)),u))] if meta else [])
+    got=_fan_out(lambda fn,a: fn(*a),jobs)
+    fix=(got.pop() if meta else None) or {}
+    for k in meta:
+        if fix.get(k): blog[k]=fix[k]
+    for i,text in zip(todo,got):
+        if not text: rec["fallback_parts"]=rec.get("fallback_parts",0)+1
+        blog["body"]=insert_section(blog["body"],i,text or _fb_section(topic,img_n,mode,i))
+    lost=[a for a in _ANCHORS.values() if a not in blog["body"]]
+    if lost: blog["body"]+="\n\n"+"\n".join(lost)
+    rec["repaired"]=[BLOG_SECTIONS[i][0] for i,t in zip(todo,got) if t]+[k for k in meta if fix.get(k)]
+    return blog
+
+# ============== 부분 재생성 ==============
+# 패키지 전체 대신 항목 하나(챕터 i · 블로그 섹션 · 제목 · 해시태그/태그 · 이미지 프롬프트 1개)만 작은 호출로 다시 받아
+# 보관된 패키지에 끼운다. 앞뒤 내용과 지금 값을 맥락으로 넣어 흐름은 맞추고 표현은 다르게. 캐시는 건너뜀(refresh).
+# 실패하면 RuntimeError — 호출자는 기존 패키지를 그대로 둔다.
+def section_spans(body: str) -> list:
+    # [(제목, 본문 시작, 본문 끝)]. "서론" = "## 제목" 줄 다음부터 첫 "###" 전까지
+    body=body or ""
+    hs=list(re.finditer(r"^###\s+(.+?)\s*$",body,re.M))
+    top=re.match(r"##\s[^\n]*\n?",body)
+    spans=[("서론",top.end() if top else 0,hs[0].start() if hs else len(body))]
+    for k,m in enumerate(hs):
+        spans.append((m.group(1),m.end(),hs[k+1].start() if k+1<len(hs) else len(body)))
+    return spans
+
+def section_heads(body: str) -> list:
+    return [h for h,a,b in section_spans(body) if h!="서론" or body[a:b].strip()]
+
+def replace_section(body: str, head: str, text: str) -> str:
+    # head 섹션 본문만 교체. 제목 줄과 그 섹션 안의 이미지 앵커·CTA 줄은 유지
+    for h,a,b in section_spans(body):
+        if h!=head: continue
+        keep=[l for l in body[a:b].split("\n") if l.strip().startswith("[이미지:") or l.strip()==CTA]
+        new="\n"+text.strip()+("\n\n"+"\n".join(keep) if keep else "")+"\n\n"
+        return (body[:a]+new+body[b:].lstrip("\n")).rstrip()+"\n"
+    raise KeyError(head)
+
+def _regen_cx(sys,topic,tone,mode,age,gender,model,temperature,policy,**kw) -> dict:
+    policy=policy or DEFAULT_POLICY
+    return _cx(sys,_head(topic,tone,mode,age,gender),model,min(temperature,0.6),True,policy,
+               time.monotonic()+policy.deadline_s,**kw)
+
+def _regen_field(cx,cls,field,current,context) -> list:
+    n=len(current) or (10 if field=="titles" else 20)
+    u=(f"[part]regen\n{cx['head']}{context}[current]{json.dumps(current,ensure_ascii=False)}\n[fields]{field}\n"
+       f"규칙: {field}만 {n}개. 현재 값과 겹치지 않게 새로.")
+    return _ask(cx,_subset(cls,(field,)),u).get(field)
+
+def regen_youtube(yt,item,topic,tone,mode,model,*,age="성인",gender="혼합",temperature=0.6,policy=None) -> dict:
+    # item: "titles" | "hashtags" | ("chapter", i)
+    with telemetry.span("regen", target="youtube", item=str(item), topic=topic, model=model):
+        cx=_regen_cx(SYS_YT,topic,tone,mode,age,gender,model,temperature,policy)
+        yt=json.loads(json.dumps(yt))  # 보관본은 건드리지 않음
+        chs=yt.get("chapters") or []
+        if isinstance(item,tuple) and item[0]=="chapter":
+            i=item[1]; sc=lambda k: (chs[k].get("script") or "") if 0<=k<len(chs) else ""
+            extra=(f"[앞 챕터 끝]{sc(i-1)[-200:]}\n[뒤 챕터 시작]{sc(i+1)[:200]}\n[현재]{sc(i)[:400]}\n"
+                   "현재 스크립트와 다른 표현·사례로, 앞뒤 챕터와 자연스럽게 이어지게.\n")
+            new=_chapter_script(cx,i,[c.get("title","") for c in chs],extra)
+            if not new: raise RuntimeError("챕터 재생성 실패")
+            chs[i]["script"]=new
+            return yt
+        context=f"[N]{len(chs)}\n[have] 설명: {(yt.get('description') or '')[:300]}\n챕터: "+" / ".join(c.get("title","") for c in chs)+"\n"
+        new=_regen_field(cx,YouTube,item,yt.get(item) or [],context)
+        if not new: raise RuntimeError(f"{item} 재생성 실패")
+        yt[item]=new
+        return yt
+
+# 이미지 라벨 → 관련 섹션(앵커 위치 기준: 대표=서론, 본문1=핵심, 본문2=체크리스트, 이후는 순서대로)
+def _image_section(label: str) -> int:
+    if label=="대표": return 0
+    m=re.match(r"본문(\d+)",label or "")
+    return min(int(m.group(1)),len(BLOG_SECTIONS)-1) if m else 0
+
+def regen_blog(blog,item,topic,tone,mode,min_chars,model,*,age="성인",gender="혼합",temperature=0.6,policy=None) -> dict:
+    # item: "titles" | "tags" | ("section", 제목) | ("image", i)
+    with telemetry.span("regen", target="blog", item=str(item), topic=topic, model=model):
+        cx=_regen_cx(_sys_blog(min_chars),topic,tone,mode,age,gender,model,temperature,policy,min_chars=min_chars)
+        blog=json.loads(json.dumps(blog))
+        body=blog.get("body") or ""
+        title=(blog.get("titles") or [topic])[0]
+        secs={h:body[a:b] for h,a,b in section_spans(body)}
+        if isinstance(item,tuple) and item[0]=="section":
+            h=item[1]; k=_section_index(h); heads=list(secs)
+            prev=secs.get(heads[heads.index(h)-1],"") if h in heads and heads.index(h)>0 else ""
+            extra=(f"[앞 섹션 끝]{prev.strip()[-200:]}\n[현재]{secs.get(h,'').strip()[:400]}\n"
+                   "현재 본문과 다른 표현·사례로, 앞 섹션과 자연스럽게 이어지게.\n")
+            spec=k if k is not None else (h,"이 소제목에 맞는 본문",.12)
+            new=_section_text(cx,spec,title,(),extra)
+            if not new: raise RuntimeError("섹션 재생성 실패")
+            blog["body"]=replace_section(body,h,new)
+            return blog
+        if isinstance(item,tuple) and item[0]=="image":
+            i=item[1]; img=blog["images"][i]
+            sec=split_sections(body).get(BLOG_SECTIONS[_image_section(img.get("label",""))][0],"")
+            u=(f"[part]image\n{cx['head']}[title]{title}\n[label]{img.get('label','')}\n[section]{sec[:400]}\n"
+               f"[current]{img.get('en','')}\n규칙: 이 섹션을 보여줄 EN 이미지 프롬프트 1개(텍스트 오버레이 없음). 현재와 다른 장면·구도로.")
+            new=_ask(cx,EnPrompt,u,300).get("en")
+            if not new: raise RuntimeError("이미지 프롬프트 재생성 실패")
+            blog["images"][i]={**img,"en":new}
+            return blog
+        context=f"[title]{title}\n[have] 목차: "+" / ".join(section_heads(body))+f"\n서론: {secs.get('서론','').strip()[:300]}\n"
+        new=_regen_field(cx,Blog,item,blog.get(item) or [],context)
+        if not new: raise RuntimeError(f"{item} 재생성 실패")
+        blog[item]=new
+        return blog
+
+# ============== 내보내기 ==============
+def join_tags(tags:list, style:str) -> str:
+    return "\n".join(tags) if style=="줄바꿈 여러 줄" else " ".join(tags)
+
+def build_youtube_txt(yt:dict) -> str:
+    titles="\n".join(f"{i+1}. {t}" for i,t in enumerate(yt.get("titles",[])[:10]))
+    chapters="\n\n".join(f"[챕터 {i+1}] {c.get('title','')}\n{c.get('script','')}" for i,c in enumerate(yt.get("chapters",[])))
+    desc=yt.get("description","").strip()
+    tags=" ".join(yt.get("hashtags",[]))
+    return f"# YouTube Package\n\n## Titles\n{titles}\n\n## Description\n{desc}\n\n## Chapters\n{chapters}\n\n## Hashtags\n{tags}\n"
+
+def build_blog_md(blog:dict) -> str:
+    titles="\n".join(f"{i+1}. {t}" for i,t in enumerate(blog.get("titles",[])[:10]))
+    body=blog.get("body","")
+    tags=" ".join(blog.get("tags",[]))
+    return f"# Blog Package\n\n## Titles\n{titles}\n\n## Body\n{body}\n\n## Tags\n{tags}\n"
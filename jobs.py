@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# 백그라운드 작업 큐 — gen_youtube/gen_blog 를 프로세스 공용 워커 풀에서 돌리고 작업 ID로 상태·결과 조회
+# 세션(스크립트 스레드)은 제출만 하고 바로 돌아감 → 사용자끼리 서로 막지 않고, 새로고침해도 작업은 계속 진행.
+# 대기열 길이 제한 + 사용자별 동시 작업 제한. 끝난 작업은 JOB_TTL_S 동안 메모리에 보관(프로세스 재시작 시 사라짐).
+#
+#   q = get_queue()
+#   jid = q.submit(user, core.gen_youtube, topic, tone, 5, "info", model, stream=True, age=..., ...)
+#   q.get(jid)   # {"state": queued/running/done/failed/cancelled, "position", "partial", "result", "error", ...}
+#   q.wait(jid)  # 결과 반환(실패면 RuntimeError)
+
+import os, time, uuid, queue, threading
+
+import telemetry
+
+JOB_WORKERS   = int(os.getenv("JOB_WORKERS", "4"))      # 동시에 도는 생성 수(프로세스 전체)
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "32"))   # 대기 가능한 작업 수
+JOB_PER_USER  = int(os.getenv("JOB_PER_USER", "2"))     # 사용자당 대기+실행 중 작업 수(유튜브+블로그 = 2). 앱에선 사용자 = 탭(?u=)
+JOB_TTL_S     = float(os.getenv("JOB_TTL_S", "3600"))   # 끝난 작업 보관 시간
+
+ACTIVE = ("queued", "running")
+
+class JobRejected(RuntimeError):
+    # 대기열 가득 / 사용자 한도 초과 — 제출 자체를 받지 않음(과금 없음)
+    pass
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, maxsize: int = JOB_QUEUE_MAX,
+                 per_user: int = JOB_PER_USER, ttl_s: float = JOB_TTL_S):
+        self.maxsize, self.per_user, self.ttl_s = maxsize, per_user, ttl_s
+        self._q, self._jobs, self._lock = queue.Queue(), {}, threading.Lock()  # 한도는 대기 상태 수로 셈(취소분 제외)
+        self._threads = [threading.Thread(target=self._work, name=f"job-{i}", daemon=True) for i in range(workers)]
+        for t in self._threads: t.start()
+
+    def submit(self, user: str, fn, *args, meta: dict = None, dedup: str = None, stream: bool = False, **kw) -> str:
+        # dedup: 같은 사용자의 같은 입력이 아직 진행 중이면 새로 만들지 않고 그 ID 반환(새로고침·두 번 클릭 중복 과금 방지)
+        # stream: fn 에 on_partial 을 넘겨 진행 중 스냅샷을 job["partial"] 로 받음
+        with self._lock:
+            self._prune()
+            mine = [j for j in self._jobs.values() if j["user"] == user and j["state"] in ACTIVE]
+            for j in mine:
+                if dedup and j["dedup"] == dedup: return j["id"]
+            if len(mine) >= self.per_user:
+                raise JobRejected(f"동시 작업 한도({self.per_user}건) 초과 — 진행 중인 작업이 끝난 뒤 다시 시도하세요.")
+            if sum(j["state"] == "queued" for j in self._jobs.values()) >= self.maxsize:
+                raise JobRejected(f"대기열이 가득 찼습니다({self.maxsize}건) — 잠시 후 다시 시도하세요.")
+            job = {"id": uuid.uuid4().hex[:12], "user": user, "dedup": dedup, "meta": meta or {},
+                   "state": "queued", "submitted": time.time(), "started": None, "finished": None,
+                   "partial": None, "result": None, "error": None,
+                   "_call": (fn, args, kw, stream), "_done": threading.Event()}
+            self._jobs[job["id"]] = job
+            self._q.put(job["id"])
+        return job["id"]
+
+    def get(self, jid: str, user: str = None):
+        # 상태 스냅샷(내부 필드 제외). 없거나(만료) 다른 사용자 작업이면 None. 대기 중이면 position = 앞 작업 수
+        with self._lock:
+            job = self._jobs.get(jid)
+            if not job or (user is not None and job["user"] != user): return None
+            out = {k: v for k, v in job.items() if not k.startswith("_")}
+            if job["state"] == "queued":
+                out["position"] = sum(j["state"] == "queued" and j["submitted"] < job["submitted"] for j in self._jobs.values())
+        return out
+
+    def cancel(self, jid: str, user: str = None) -> bool:
+        # 대기 중인 작업만 취소(실행 중 호출은 끊지 않음 — 이미 과금된 응답은 받아서 보관)
+        with self._lock:
+            job = self._jobs.get(jid)
+            if not job or job["state"] != "queued" or (user is not None and job["user"] != user): return False
+            job["state"], job["finished"] = "cancelled", time.time()
+            job.pop("_call", None); job["_done"].set()
+        return True
+
+    def wait(self, jid: str, timeout: float = None):
+        with self._lock: job = self._jobs.get(jid)
+        if not job: raise KeyError(jid)
+        if not job["_done"].wait(timeout): raise TimeoutError(jid)
+        if job["state"] != "done": raise RuntimeError(job["error"] or job["state"])
+        return job["result"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = [j["state"] for j in self._jobs.values()]
+        return {s: states.count(s) for s in ("queued", "running", "done", "failed", "cancelled")}
+
+    def close(self):
+        for _ in self._threads: self._q.put(None)
+
+    def _prune(self):
+        # 락 안에서 호출. 끝난 지 ttl_s 지난 작업 제거
+        since = time.time() - self.ttl_s
+        for jid in [jid for jid, j in self._jobs.items() if j["finished"] and j["finished"] < since]:
+            del self._jobs[jid]
+
+    def _work(self):
+        while True:
+            jid = self._q.get()
+            if jid is None: return
+            with self._lock:
+                job = self._jobs.get(jid)
+                if not job or job["state"] != "queued": continue  # 취소됨
+                job["state"], job["started"] = "running", time.time()
+                fn, args, kw, stream = job.pop("_call")
+            if stream: kw = {**kw, "on_partial": lambda snap: job.__setitem__("partial", snap)}
+            try:
+                res, err = fn(*args, **kw), None
+            except Exception as e:
+                res, err = None, f"{type(e).__name__}: {e}"
+            with self._lock:
+                job["result"], job["error"], job["partial"] = res, err, None
+                job["state"], job["finished"] = ("failed" if err else "done"), time.time()
+            job["_done"].set()
+            telemetry.emit({"kind": "job", "id": jid, "ts": job["submitted"], "state": job["state"],
+                            "target": job["meta"].get("k"), "topic": job["meta"].get("topic"),
+                            "wait_ms": round((job["started"] - job["submitted"]) * 1000, 1),
+                            "ms": round((job["finished"] - job["started"]) * 1000, 1)})
+
+# 프로세스당 1개(Streamlit 세션들이 공유). 처음 쓸 때 워커 시작
+_queue, _queue_lock = None, threading.Lock()
+
+def get_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None: _queue = JobQueue()
+    return _queue
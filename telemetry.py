@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# 호출 계측 — 지연·토큰·재시도·모델 스위치·JSON 파싱 실패·폴백 사용을 로컬 JSONL에 추가 기록(append-only)
+# span("gen") 안에서 일어난 span("call") 은 parent 로 묶이고, 토큰/시도 수는 부모에 합산된다.
+# 기록 실패는 생성 흐름에 영향을 주지 않는다.
+
+import os, json, time, uuid, threading, contextvars
+from contextlib import contextmanager
+
+TELEMETRY_PATH = os.getenv("TELEMETRY_PATH", os.path.join(".cache", "telemetry.jsonl"))  # 빈 값 = 끔
+
+_cur = contextvars.ContextVar("telemetry_span", default=None)
+_lock = threading.Lock()
+_sinks = []  # 추가 수신자(벤치마크 등): fn(rec)
+
+def add_sink(fn):
+    _sinks.append(fn)
+
+def remove_sink(fn):
+    if fn in _sinks: _sinks.remove(fn)
+
+def current():
+    return _cur.get()
+
+def emit(rec: dict):
+    for fn in list(_sinks):
+        try: fn(rec)
+        except Exception: pass
+    if not TELEMETRY_PATH: return
+    line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+    try:
+        with _lock:
+            os.makedirs(os.path.dirname(TELEMETRY_PATH) or ".", exist_ok=True)
+            with open(TELEMETRY_PATH, "a", encoding="utf-8") as f: f.write(line)
+    except OSError:
+        pass
+
+@contextmanager
+def span(kind: str, **fields):
+    parent = _cur.get()
+    rec = {"kind": kind, "id": uuid.uuid4().hex[:12], "parent": parent["id"] if parent else None,
+           "ts": time.time(), **fields}
+    tok = _cur.set(rec)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        rec["error"] = type(e).__name__
+        raise
+    finally:
+        rec["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        _cur.reset(tok)
+        if parent is not None:  # 토큰/시도 수 부모에 합산(분할 생성은 자식이 여러 스레드에서 동시에 끝남)
+            with _lock:
+                for k in ("prompt_tokens", "completion_tokens", "attempts"):
+                    if rec.get(k): parent[k] = parent.get(k, 0) + rec[k]
+        emit(rec)
+
+def read(days: float = 30, limit: int = 50000) -> list:
+    # 최근 limit 줄 중 days 이내 기록
+    if not TELEMETRY_PATH or not os.path.exists(TELEMETRY_PATH): return []
+    with open(TELEMETRY_PATH, encoding="utf-8") as f:
+        lines = f.readlines()[-limit:]
+    since, out = time.time() - days * 86400, []
+    for l in lines:
+        try: rec = json.loads(l)
+        except ValueError: continue
+        if rec.get("ts", 0) >= since: out.append(rec)
+    return out
+
+def pct(xs, q: float):
+    xs = sorted(x for x in xs if x is not None)
+    return xs[min(len(xs)-1, int(q * len(xs)))] if xs else None
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+# 테스트는 캐시·텔레메트리 파일 없이, 저장소 루트의 모듈을 바로 import
+import os, sys
+
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ["TELEMETRY_PATH"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# core 순수 함수(네트워크 없음): 잘린 JSON 살리기 · 스트리밍 파서 · 블로그 본문 섹션 나누기/교체/끼우기 · 응답 캐시(만료/LRU)
+#   python -m pytest -q
+
+import json, types
+
+import pytest
+
+import core
+
+BODY = ("## 보일러 교체\n\n서론 문단.\n\n[이미지:대표]\n\n"
+        "### 핵심 포인트 5가지\n1) 가\n2) 나\n\n[이미지:본문1]\n\n"
+        "### 체크리스트\n- a\n\n[이미지:본문2]\n\n"
+        "### 자주 묻는 질문(FAQ)\nQ. 비용?\nA. 상황별.\n\n"
+        f"### 마무리\n끝.\n\n{core.CTA}\n")
+
+# ============== salvage_json ==============
+def test_salvage_json_valid_and_trailing_comma():
+    assert core.salvage_json('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert core.salvage_json('{"a": [1, 2,], "b": 3,}') == {"a": [1, 2], "b": 3}
+
+def test_salvage_json_truncated_keeps_closed_values():
+    s = '{"youtube": {"titles": ["t1", "t2"], "description": "설명", "chapters": [{"title": "c1", "script": "s1"}, {"title": "c2", "scr'
+    yt = core.salvage_json(s)["youtube"]
+    assert yt["titles"] == ["t1", "t2"] and yt["description"] == "설명"
+    assert yt["chapters"][0] == {"title": "c1", "script": "s1"}
+
+def test_salvage_json_partial_includes_open_string():
+    s = '{"blog": {"titles": ["t"], "body": "## 제목\\n\\n서론 쓰는 중'
+    assert "body" not in core.salvage_json(s)["blog"]
+    assert core.salvage_json(s, partial=True)["blog"]["body"] == "## 제목\n\n서론 쓰는 중"
+
+def test_salvage_json_garbage():
+    assert core.salvage_json("설명 문장뿐") == {}
+    assert core.salvage_json(None) == {}
+
+# ============== JsonStream ==============
+def test_json_stream_chunks_match_whole():
+    doc = {"youtube": {"titles": ["a", "b\"c"], "n": 3, "ok": True, "chapters": [{"title": "줄\n바꿈"}]}}
+    s = "앞 잡음 " + json.dumps(doc, ensure_ascii=False)
+    js = core.JsonStream()
+    for i in range(0, len(s), 7): js.feed(s[i:i+7])
+    assert js.done and js.snapshot() == doc
+
+def test_json_stream_snapshot_grows_with_closed_values():
+    js = core.JsonStream()
+    assert js.snapshot() == {}
+    assert js.feed('{"titles": ["a", "b"') is True
+    assert js.snapshot() == {"titles": ["a", "b"]}
+    js.feed("]")
+    js.feed(', "desc": "쓰는')
+    assert js.snapshot() == {"titles": ["a", "b"]}
+    assert js.snapshot(partial=True) == {"titles": ["a", "b"], "desc": "쓰는"}
+    assert not js.done
+
+def test_json_stream_cut_escape():
+    js = core.JsonStream(); js.feed('{"a": "x\\u00')
+    assert js.snapshot(partial=True) == {"a": "x"}
+
+# ============== split_sections ==============
+def test_split_sections_maps_loose_heads_and_drops_anchors():
+    secs = core.split_sections(BODY)
+    assert list(secs) == ["서론", "핵심 5가지", "체크리스트(6~8)", "FAQ(3)", "마무리"]
+    assert secs["서론"] == "서론 문단."
+    assert secs["체크리스트(6~8)"] == "- a"
+    assert "[이미지:" not in "".join(secs.values())
+
+def test_split_sections_unknown_head_kept():
+    assert core.split_sections("서론\n\n### 시공 사례\n내용")["시공 사례"] == "내용"
+    assert core.split_sections("") == {"서론": ""}
+
+def test_split_sections_roundtrip_with_assemble():
+    texts = [f"{h} 본문" for h, _, _ in core.BLOG_SECTIONS]
+    secs = core.split_sections(core.assemble_blog_body("주제", texts))
+    assert list(secs.values()) == texts
+
+# ============== replace_section ==============
+def test_replace_section_keeps_heading_anchor_and_cta():
+    out = core.replace_section(BODY, "핵심 포인트 5가지", "새 핵심")
+    secs = core.split_sections(out)
+    assert secs["핵심 5가지"] == "새 핵심"
+    assert out.count("[이미지:본문1]") == 1 and out.index("새 핵심") < out.index("[이미지:본문1]") < out.index("### 체크리스트")
+    assert core.split_sections(core.replace_section(BODY, "마무리", "새 끝"))["마무리"] == f"새 끝\n\n{core.CTA}"
+    assert {k: v for k, v in secs.items() if k != "핵심 5가지"} == {k: v for k, v in core.split_sections(BODY).items() if k != "핵심 5가지"}
+
+def test_replace_section_intro_and_missing():
+    assert core.split_sections(core.replace_section(BODY, "서론", "새 서론"))["서론"] == "새 서론"
+    with pytest.raises(KeyError):
+        core.replace_section(BODY, "없는 섹션", "x")
+
+# ============== insert_section ==============
+def test_insert_section_goes_in_place():
+    body = BODY.replace("### 체크리스트\n- a\n\n[이미지:본문2]\n\n", "")
+    out = core.insert_section(body, 2, "- 새 항목")
+    assert list(core.split_sections(out)) == ["서론", "핵심 5가지", "체크리스트(6~8)", "FAQ(3)", "마무리"]
+    assert out.index("[이미지:본문2]") < out.index("### 자주 묻는 질문")
+
+def test_insert_section_appends_when_last():
+    body = BODY[:BODY.index("### 마무리")]
+    out = core.insert_section(body, 5, "끝.")
+    assert out.rstrip().endswith("### 마무리\n끝.")
+
+# ============== 부분 복구(_salvage_youtube) ==============
+def _cut_youtube(n_done: int) -> str:
+    yt = {"titles": [f"t{i}" for i in range(10)], "description": "설명",
+          "chapters": [{"title": f"c{i}", "script": f"s{i}"} for i in range(5)], "hashtags": ["#a"] * 20}
+    s = json.dumps({"youtube": yt}, ensure_ascii=False)
+    return s[:s.index('{"title": "c%d"' % n_done) + 12]  # n_done번째 챕터 도중 잘림(hashtags 없음)
+
+def test_salvage_youtube_pads_when_repair_fails(monkeypatch):
+    replies = iter([_cut_youtube(2), ""])  # 첫 응답은 챕터 2개 뒤 잘림, 복구 호출은 실패
+    monkeypatch.setattr(core, "call_json", lambda *a, **kw: next(replies, ""))
+    rep = {}
+    yt = core.gen_youtube("보일러", "전문가형", 5, "info", "m", policy=core.RetryPolicy(fallback_model=""), report=rep)
+    assert [c["script"] for c in yt["chapters"][:2]] == ["s0", "s1"]
+    assert len(yt["chapters"]) == 5 and all(c["script"] for c in yt["chapters"])
+    assert yt["hashtags"] and yt["titles"] == [f"t{i}" for i in range(10)]
+    assert rep["salvaged"] and rep["repaired"] == []
+    assert rep["fallback_parts"] == 4  # 챕터 3개 + 해시태그
+
+def test_salvage_youtube_repair_fills_without_fallback(monkeypatch):
+    fix = json.dumps({"chapters": [{"title": f"r{i}", "script": f"rs{i}"} for i in range(3)],
+                      "images": {"thumbnail": {"en": "x"}, "chapters": [{"index": 1, "en": "y"}]}, "hashtags": ["#b"] * 20})
+    replies = iter([_cut_youtube(2), fix])
+    monkeypatch.setattr(core, "call_json", lambda *a, **kw: next(replies, ""))
+    rep = {}
+    yt = core.gen_youtube("보일러", "전문가형", 5, "info", "m", policy=core.RetryPolicy(fallback_model=""), report=rep)
+    assert [c["script"] for c in yt["chapters"]] == ["s0", "s1", "rs0", "rs1", "rs2"]
+    assert yt["hashtags"] == ["#b"] * 20 and "fallback_parts" not in rep and "fallback" not in rep
+
+# ============== 응답 캐시(cache_put/cache_get) ==============
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    # 임시 파일 + 3000바이트 한도 + 가짜 시계(used 순서가 호출 순서와 같도록)
+    clock = [1000.0]
+    monkeypatch.setattr(core, "CACHE_PATH", str(tmp_path / "c.sqlite3"))
+    monkeypatch.setattr(core, "CACHE_MAX_MB", 3000 / 1024 / 1024)
+    monkeypatch.setattr(core, "time", types.SimpleNamespace(time=lambda: clock[0]))
+    def tick(s=1.0): clock[0] += s
+    return tick
+
+def test_cache_evicts_least_recently_used(cache):
+    for k in "abc":
+        core.cache_put(k, k * 1000); cache()
+    assert core.cache_stats() == {"entries": 3, "bytes": 3000}  # 한도와 같음 — 아직 안 지움
+    assert core.cache_get("a") == "a" * 1000; cache()  # a를 최근 사용으로
+    core.cache_put("d", "d" * 1000)
+    assert core.cache_get("b") is None  # 가장 오래 안 쓴 키
+    assert [core.cache_get(k) for k in "acd"] == ["a" * 1000, "c" * 1000, "d" * 1000]
+    assert core.cache_stats()["bytes"] == 3000
+
+def test_cache_keeps_newest_even_when_oversized(cache):
+    core.cache_put("a", "a" * 1000); cache()
+    core.cache_put("big", "x" * 4000)
+    assert core.cache_get("a") is None and core.cache_get("big") == "x" * 4000
+
+def test_cache_expired_entry_is_miss(cache):
+    core.cache_put("k", "v", ttl_h=1)
+    assert core.cache_get("k") == "v"
+    cache(3601)
+    assert core.cache_get("k") is None
+    assert core.cache_stats()["entries"] == 0  # 만료분은 읽을 때 지움
+
+def test_cache_put_drops_other_expired(cache):
+    core.cache_put("old", "v", ttl_h=1); cache(3601)
+    core.cache_put("new", "w")
+    assert core.cache_stats() == {"entries": 1, "bytes": 1}
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# 백그라운드 작업 큐(JobQueue): 사용자별 한도 · dedup · 대기열 한도(대기 상태만) · 대기 중 취소 · TTL 정리
+#   python -m pytest -q
+
+import time, threading
+
+import pytest
+
+import jobs
+
+@pytest.fixture
+def gate():
+    # 워커를 붙잡아 두는 fn — gate.set() 전까지 실행 중 상태 유지
+    ev = threading.Event()
+    yield ev
+    ev.set()
+
+def _hold(ev, v="ok"):
+    ev.wait(5); return v
+
+def _q(**kw):
+    # 워커 1개 — 첫 작업이 실행 중이면 나머지는 확정적으로 대기 상태
+    return jobs.JobQueue(**{"workers": 1, "maxsize": 10, "per_user": 2, "ttl_s": 60, **kw})
+
+def _until(q, jid, state):
+    for _ in range(200):
+        if q.get(jid)["state"] == state: return
+        time.sleep(0.01)
+    raise AssertionError(q.get(jid))
+
+def test_result_and_failure():
+    q = _q()
+    ok, bad = q.submit("u", lambda x: x * 2, 21), q.submit("v", lambda: 1 / 0)
+    assert q.wait(ok, 5) == 42
+    with pytest.raises(RuntimeError, match="ZeroDivisionError"): q.wait(bad, 5)
+    assert q.get(bad)["state"] == "failed" and q.stats()["done"] == 1
+    q.close()
+
+def test_per_user_limit(gate):
+    q = _q(per_user=2)
+    a = q.submit("u", _hold, gate); q.submit("u", _hold, gate)
+    with pytest.raises(jobs.JobRejected, match="동시 작업 한도"): q.submit("u", _hold, gate)
+    q.submit("other", _hold, gate)  # 다른 사용자는 별도
+    gate.set(); q.wait(a, 5)
+    q.submit("u", lambda: 1)  # 끝난 작업은 한도에서 빠짐
+    q.close()
+
+def test_dedup_returns_active_job(gate):
+    q = _q()
+    a = q.submit("u", _hold, gate, dedup="k")
+    assert q.submit("u", _hold, gate, dedup="k") == a
+    assert q.submit("v", _hold, gate, dedup="k") != a  # 다른 사용자의 같은 키는 별개
+    gate.set(); q.wait(a, 5)
+    assert q.submit("u", lambda: 1, dedup="k") != a   # 끝난 뒤엔 새 작업
+    q.close()
+
+def test_queue_bound_counts_only_queued(gate):
+    q = _q(maxsize=2, per_user=5)
+    run = q.submit("u1", _hold, gate); _until(q, run, "running")
+    b, c = q.submit("u2", _hold, gate), q.submit("u3", _hold, gate)
+    assert (q.get(b)["position"], q.get(c)["position"]) == (0, 1)
+    with pytest.raises(jobs.JobRejected, match="대기열"): q.submit("u4", _hold, gate)
+    assert q.cancel(c, "u3")
+    q.submit("u4", _hold, gate)  # 취소된 작업은 자리를 차지하지 않음
+    q.close()
+
+def test_cancel_only_while_queued(gate):
+    q = _q()
+    run = q.submit("u", _hold, gate); _until(q, run, "running")
+    wait = q.submit("u", _hold, gate)
+    assert not q.cancel(wait, "someone-else")
+    assert not q.cancel(run, "u")      # 실행 중은 취소 안 됨
+    assert q.cancel(wait, "u") and not q.cancel(wait, "u")
+    with pytest.raises(RuntimeError, match="cancelled"): q.wait(wait, 1)
+    gate.set(); assert q.wait(run, 5) == "ok"
+    assert q.get(wait)["state"] == "cancelled"  # 워커가 꺼내도 실행하지 않음
+    q.close()
+
+def test_get_hides_other_users_and_internals():
+    q = _q()
+    a = q.submit("u", lambda: 1); q.wait(a, 5)
+    assert q.get(a, "v") is None
+    assert not any(k.startswith("_") for k in q.get(a, "u"))
+    q.close()
+
+def test_ttl_prunes_finished_jobs(gate):
+    q = _q(ttl_s=0.05)
+    done = q.submit("u", lambda: 1); q.wait(done, 5)
+    live = q.submit("v", _hold, gate); _until(q, live, "running")
+    time.sleep(0.1)
+    q.submit("w", lambda: 2)  # 제출 때 정리
+    assert q.get(done) is None and q.get(live)["state"] == "running"
+    q.close()
+
+def test_stream_partial():
+    q = _q()
+    seen = threading.Event(); release = threading.Event()
+    def fn(on_partial=None):
+        on_partial({"titles": ["a"]}); seen.set(); release.wait(5); return "ok"
+    a = q.submit("u", fn, stream=True)
+    seen.wait(5)
+    assert q.get(a)["partial"] == {"titles": ["a"]}
+    release.set(); q.wait(a, 5)
+    assert q.get(a)["partial"] is None
+    q.close()
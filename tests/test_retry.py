@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# 재시도 정책(네트워크 없음): 오류 분류 · Retry-After 해석 · 백오프 · 헤지 시계(레이트 리밋 대기 제외)
+#   python -m pytest -q
+
+import json, time, types, random
+from email.utils import format_datetime
+from datetime import datetime, timezone, timedelta
+
+import httpx
+import openai
+import pytest
+
+import core
+
+REQ = httpx.Request("POST", "http://stub/v1/chat/completions")
+
+def _status(code: int, headers: dict = None, body=None):
+    resp = httpx.Response(code, headers=headers or {}, request=REQ)
+    return openai.APIStatusError("err", response=resp, body=body)
+
+# ============== is_retryable ==============
+@pytest.mark.parametrize("code", [408, 409, 429, 500, 502, 503])
+def test_retryable_status(code):
+    assert core.is_retryable(_status(code))
+
+@pytest.mark.parametrize("code", [400, 401, 403, 404, 422])
+def test_not_retryable_status(code):
+    assert not core.is_retryable(_status(code))
+
+def test_quota_exhausted_not_retryable():
+    assert not core.is_retryable(_status(429, body={"code": "insufficient_quota"}))
+
+def test_transport_errors_retryable():
+    assert core.is_retryable(openai.APIConnectionError(request=REQ))
+    assert core.is_retryable(openai.APITimeoutError(request=REQ))
+    assert core.is_retryable(httpx.ReadTimeout("t"))
+    assert core.is_retryable(httpx.RemoteProtocolError("끊김"))
+    assert not core.is_retryable(ValueError("x"))
+
+# ============== retry_after_s ==============
+def test_retry_after_headers():
+    assert core.retry_after_s(_status(429, {"retry-after-ms": "1500"})) == 1.5
+    assert core.retry_after_s(_status(429, {"retry-after": "3"})) == 3.0
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < core.retry_after_s(_status(503, {"retry-after": format_datetime(when, usegmt=True)})) <= 30
+    past = datetime.now(timezone.utc) - timedelta(seconds=30)
+    assert core.retry_after_s(_status(503, {"retry-after": format_datetime(past, usegmt=True)})) == 0.0
+
+def test_retry_after_missing_or_garbage():
+    assert core.retry_after_s(_status(429)) is None
+    assert core.retry_after_s(_status(429, {"retry-after": "soon"})) is None
+    assert core.retry_after_s(ValueError("응답 없음")) is None
+
+# ============== backoff ==============
+def test_backoff_uses_retry_after():
+    p = core.RetryPolicy()
+    assert p.backoff(0, 2.5) == 2.5
+    assert p.backoff(3, -1.0) == 0.0
+
+def test_backoff_full_jitter_capped():
+    p = core.RetryPolicy(base_s=0.5, cap_s=3.0)
+    random.seed(1)
+    for attempt, hi in [(0, 0.5), (1, 1.0), (2, 2.0), (3, 3.0), (8, 3.0)]:
+        xs = [p.backoff(attempt) for _ in range(200)]
+        assert all(0 <= x <= hi for x in xs) and max(xs) > hi * 0.8
+
+# ============== 헤지 ==============
+class _Client:
+    # 모델별 지연을 흉내 내고 보낸 모델 순서를 기록
+    def __init__(self, delay: dict):
+        self.delay, self.sent = delay, []
+
+    chat = property(lambda s: s)
+    completions = property(lambda s: s)
+
+    def create(self, **kw):
+        self.sent.append(kw["model"])
+        time.sleep(self.delay.get(kw["model"], 0))
+        msg = types.SimpleNamespace(content=json.dumps({"ok": True}))
+        return types.SimpleNamespace(usage=None, choices=[types.SimpleNamespace(message=msg, finish_reason="stop")])
+
+class _SlowLimiter:
+    def __init__(self, wait_s: float):
+        self.wait_s, self.calls = wait_s, 0
+
+    def acquire(self, tokens):
+        self.calls += 1; time.sleep(self.wait_s)
+
+@pytest.fixture
+def hedge_env(monkeypatch):
+    # 최근 지연 p90 = 50ms (헤지 임계값), 캐시 없음
+    lat = core._Latency()
+    for _ in range(30): lat.add("gpt-4o-mini", 0.05)
+    monkeypatch.setattr(core, "LATENCY", lat)
+    monkeypatch.setattr(core, "_limiter", None)
+    core.set_api_key("hedge-test")
+    def use(cli):
+        monkeypatch.setitem(core._clients, "hedge-test", cli)
+        return cli
+    yield use
+    core.set_api_key("")
+
+def _call():
+    return core.call_json("s", "u", "gpt-4o-mini", 0.6, policy=core.RetryPolicy(hedge_pct=0.9, hedge_min_samples=20))
+
+def test_hedge_fires_on_slow_response(hedge_env):
+    cli = hedge_env(_Client({"gpt-4o-mini": 0.4, "gpt-4o": 0.0}))
+    assert core.find_json(_call())
+    assert cli.sent == ["gpt-4o-mini", "gpt-4o"]
+
+def test_limiter_wait_does_not_trigger_hedge(hedge_env, monkeypatch):
+    cli = hedge_env(_Client({"gpt-4o-mini": 0.01}))
+    lim = _SlowLimiter(0.5)
+    monkeypatch.setattr(core, "_limiter", lim)
+    assert core.find_json(_call())
+    assert cli.sent == ["gpt-4o-mini"] and lim.calls == 1  # 리밋 대기는 한 번, 헤지 없음